@@ -1,8 +1,34 @@
 from rest_framework import serializers
+from mainapp.cart import MAX_CART_QTY
 from mainapp.models import Cart
+from ..main.mixins import EagerLoadingMixin
+from ..main.serializers import CartProductSerializer
 
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    products = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+    prefetch_related_fields = ('products',)
+
     class Meta:
         model = Cart
         fields = '__all__'
+
+
+class CartWithItemsSerializer(CartSerializer):
+    products = CartProductSerializer(many=True, read_only=True)
+    prefetch_related_fields = ('products__product__category',)
+
+
+class CartOperationSerializer(serializers.Serializer):
+    product_slug = serializers.SlugField()
+    qty = serializers.IntegerField(min_value=0, max_value=MAX_CART_QTY, help_text='0 removes the product from the cart')
+
+
+class BulkCartSerializer(serializers.Serializer):
+    items = CartOperationSerializer(many=True, allow_empty=False)
+
+    def validate_items(self, items):
+        slugs = [item['product_slug'] for item in items]
+        if len(set(slugs)) != len(slugs):
+            raise serializers.ValidationError('Each product may appear only once')
+        return items
@@ -1,43 +1,53 @@
 from rest_framework.viewsets import ModelViewSet
 from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 
 from django.shortcuts import get_object_or_404
 
-from mainapp.models import Cart, Customer, Product, CartProduct
-from .serializers import CartSerializer
+from mainapp.cart import resolve_cart, set_cart_quantities
+from mainapp.models import Cart, Product
+from mainapp.stock import in_stock
+from .serializers import BulkCartSerializer, CartSerializer, CartWithItemsSerializer
+from ..main.mixins import EagerLoadingViewMixin
 
 
-class CartViewSet(ModelViewSet):
+class CartViewSet(EagerLoadingViewMixin, ModelViewSet):
     serializer_class = CartSerializer
     queryset = Cart.objects.all()
 
-    @staticmethod
-    def _get_cart(user):
-        cart = None
-        if user.is_authenticated:
-            customer = Customer.objects.filter(user=user).first()
-            if not customer:
-                customer = Customer.objects.create(user=user)
-            cart = Cart.objects.filter(owner=customer, in_order=False).first()
-            if not cart:
-                cart = Cart.objects.create(owner=customer, final_price=0, number_of_products=0)
+    def _get_cart(self):
+        cart, _ = resolve_cart(self.request)
         return cart
 
-    @staticmethod
-    def _get_or_create_cart_product(customer, cart, product):
-
-        cart_product, created = CartProduct.objects.get_or_create(
-            user=customer,
-            product=product,
-            cart=cart
-        )
-        return cart_product, created
-
     @action(methods=["get"], detail=False)
     def current_cart(self, *args, **kwargs):
-        cart = self._get_cart(self.request.user)
+        cart = self._get_cart()
         cart_serializer = CartSerializer(cart)
         return Response(cart_serializer.data)
 
+    @action(methods=["post"], detail=False, permission_classes=[IsAuthenticated])
+    def bulk(self, request, *args, **kwargs):
+        """
+        Applies many ``{"product_slug": ..., "qty": ...}`` operations to the current cart
+        in one transaction; qty 0 removes the product, more than the stock on hand is a 400.
+        """
+        serializer = BulkCartSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        quantities = {item['product_slug']: item['qty'] for item in serializer.validated_data['items']}
+        products = {product.slug: product for product in Product.objects.filter(slug__in=quantities)}
+        unknown = sorted(set(quantities) - set(products))
+        if unknown:
+            return Response({'items': [f'Unknown products: {", ".join(unknown)}']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        short = sorted(slug for slug, qty in quantities.items() if not in_stock(products[slug], qty))
+        if short:
+            return Response({'items': [f'Not enough stock: {", ".join(short)}']},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        cart = self._get_cart()
+        set_cart_quantities(cart, {products[slug]: qty for slug, qty in quantities.items()})
+
+        cart = CartWithItemsSerializer.setup_eager_loading(Cart.objects.filter(pk=cart.pk)).get()
+        return Response(CartWithItemsSerializer(cart, context={'request': request}).data)
@@ -0,0 +1,113 @@
+"""
+Read-only serializers that build response dicts straight from ``.values()`` rows.
+
+They skip model instantiation and per-object field introspection, and must
+produce exactly what their ModelSerializer counterparts produce for GET.
+"""
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils.encoding import filepath_to_uri
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from .serializers import ProductSerializer
+
+
+class FileUrlBuilder:
+    """Builds the url DRF's FileField would return, with the media prefix resolved once."""
+
+    def __init__(self, request=None, storage=default_storage):
+        self.use_url = api_settings.UPLOADED_FILES_USE_URL
+        self.storage = storage
+        self.prefix = None
+        if isinstance(storage, FileSystemStorage):
+            self.prefix = storage.url('')
+            if request is not None:
+                self.prefix = request.build_absolute_uri(self.prefix)
+        self.request = request
+
+    def __call__(self, name):
+        if not name:
+            return None
+        if not self.use_url:
+            return name
+        if self.prefix is not None:
+            return self.prefix + filepath_to_uri(name)
+        url = self.storage.url(name)
+        return self.request.build_absolute_uri(url) if self.request is not None else url
+
+
+FILE = object()
+NESTED = object()
+
+
+def compile_fields(serializer, prefix='', pk_column=None):
+    """
+    Walks a ModelSerializer's readable fields, nested serializers included, and returns
+    the ``.values()`` columns they read with one (name, column, convert) step per field.
+    ``convert`` is None for values passed through as they are, FILE for files, NESTED
+    for nested serializers (``column`` holds their steps) and otherwise the DRF field's
+    own ``to_representation``.
+    """
+    model = serializer.Meta.model
+    columns, steps = [], []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        source = field.source.replace('.', '__')
+        if isinstance(field, serializers.BaseSerializer):
+            # the related pk is read from the foreign key column, without the join
+            nested_columns, nested_steps = compile_fields(
+                field, f'{prefix}{source}__', prefix + model._meta.get_field(source).attname
+            )
+            columns += nested_columns
+            steps.append((name, nested_steps, NESTED))
+            continue
+        column = pk_column if pk_column and source == model._meta.pk.name else prefix + source
+        if isinstance(field, serializers.FileField):
+            convert = FILE
+        elif isinstance(field, (serializers.DateTimeField, serializers.DecimalField)):
+            convert = field.to_representation
+        else:
+            convert = None
+        columns.append(column)
+        steps.append((name, column, convert))
+    return columns, steps
+
+
+class FastProductSerializer:
+    """
+    Same output as ``ProductSerializer`` for reads, from a single joined ``.values()`` query.
+    The columns and the layout are derived from ProductSerializer's fields, once per process.
+    """
+    serializer_class = ProductSerializer
+    _compiled = None
+
+    def __init__(self, request=None):
+        self.file_url = FileUrlBuilder(request)
+        cls = type(self)
+        if cls._compiled is None:
+            cls._compiled = compile_fields(cls.serializer_class())
+        self.value_fields, self.steps = cls._compiled
+
+    def values(self, queryset):
+        return queryset.values(*self.value_fields)
+
+    def build(self, steps, row):
+        data = {}
+        for name, column, convert in steps:
+            if convert is NESTED:
+                data[name] = self.build(column, row)
+                continue
+            value = row[column]
+            if convert is FILE:
+                value = self.file_url(value)
+            elif convert is not None and value is not None:
+                value = convert(value)
+            data[name] = value
+        return data
+
+    def to_representation(self, row):
+        return self.build(self.steps, row)
+
+    def serialize(self, rows):
+        return [self.to_representation(row) for row in rows]
@@ -0,0 +1,28 @@
+import django_filters
+
+from mainapp.models import Order, Product
+
+
+class ProductFilter(django_filters.FilterSet):
+    """
+    Filters for the product list. ``ordering`` applies to page-number pagination;
+    keyset pagination always walks (category_id, id).
+    """
+    category = django_filters.CharFilter(field_name='category__slug')
+    price_min = django_filters.NumberFilter(field_name='price', lookup_expr='gte')
+    price_max = django_filters.NumberFilter(field_name='price', lookup_expr='lte')
+    slug = django_filters.CharFilter(field_name='slug', lookup_expr='startswith')
+    ordering = django_filters.OrderingFilter(fields=(('price', 'price'), ('title', 'title')))
+
+    class Meta:
+        model = Product
+        fields = ('category', 'price_min', 'price_max', 'slug')
+
+
+class OrderExportFilter(django_filters.FilterSet):
+    date_from = django_filters.DateFilter(field_name='created_date', lookup_expr='date__gte')
+    date_to = django_filters.DateFilter(field_name='created_date', lookup_expr='date__lte')
+
+    class Meta:
+        model = Order
+        fields = ('date_from', 'date_to', 'status', 'buying_type')
@@ -0,0 +1,88 @@
+from functools import update_wrapper
+
+from asgiref.sync import sync_to_async
+from django.utils.cache import get_conditional_response
+from rest_framework.exceptions import ValidationError
+
+from mainapp.caching import NAV_NAMESPACE, versions_etag
+from ..pagination import KeysetPagination
+
+
+class EagerLoadingMixin:
+    """Serializers list the relations they render so views can load them up front."""
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        if cls.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*cls.prefetch_related_fields)
+        return queryset
+
+
+class EagerLoadingViewMixin:
+    """Applies the eager loading declared by the view's serializer to its queryset."""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        if issubclass(serializer_class, EagerLoadingMixin):
+            queryset = serializer_class.setup_eager_loading(queryset)
+        return queryset
+
+
+class KeysetPaginationMixin:
+    """
+    Switches the view to KeysetPagination on ``?pagination=cursor`` or when a cursor is sent.
+    Keyset pages always walk ``keyset_ordering``, so ``?ordering=`` is rejected there.
+    """
+    keyset_ordering = ('id',)
+    ordering_query_param = 'ordering'
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('pagination') == 'cursor' or KeysetPagination.cursor_query_param in params:
+                if self.ordering_query_param in params:
+                    raise ValidationError({self.ordering_query_param: ['Not supported with cursor pagination']})
+                self._paginator = KeysetPagination(self.keyset_ordering)
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+
+class ConditionalListMixin:
+    """
+    Answers list requests with 304 when the client's ETag still matches, before
+    any row is fetched or serialized. The tag is built from the cache versions
+    of ``etag_namespaces``, which saves, deletes and bulk changes all bump, so
+    there is no Last-Modified: a deleted row has no timestamp to compare.
+    """
+    etag_namespaces = (NAV_NAMESPACE,)
+
+    def get(self, request, *args, **kwargs):
+        etag = versions_etag(self.etag_namespaces, key=request.get_full_path())
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+        return response
+
+
+class AsyncAPIViewMixin:
+    """Serves a DRF view from an async handler under ASGI; the sync view runs in one thread-sensitive call."""
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+        return update_wrapper(async_view, view)
+
+    async def dispatch(self, request, *args, **kwargs):
+        return await sync_to_async(super().dispatch)(request, *args, **kwargs)
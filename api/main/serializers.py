@@ -1,15 +1,17 @@
 from rest_framework import serializers
 from mainapp.models import Product, Category, CartProduct
+from .mixins import EagerLoadingMixin
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     category = CategorySerializer()
+    select_related_fields = ('category',)
 
     class Meta:
         model = Product
@@ -18,14 +20,17 @@ class ProductSerializer(serializers.ModelSerializer):
 
 class GetProductOfCategorySerializer(CategorySerializer):
     products = serializers.SerializerMethodField()
+    prefetch_related_fields = ('product_set',)
 
     @staticmethod
     def get_products(obj):
-        return ProductSerializer(Product.objects.filter(category=obj), many=True).data
+        # product_set is prefetched, the products get their category cache from it
+        return ProductSerializer(obj.product_set.all(), many=True).data
 
 
-class CartProductSerializer(serializers.ModelSerializer):
+class CartProductSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     product = ProductSerializer()
+    select_related_fields = ('product__category',)
 
     class Meta:
         model = CartProduct
@@ -1,19 +1,109 @@
-from rest_framework import generics
+from django.db import models
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import generics, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from .fast_serializers import FastProductSerializer
+from .filters import OrderExportFilter, ProductFilter
+from .mixins import AsyncAPIViewMixin, ConditionalListMixin, EagerLoadingViewMixin, KeysetPaginationMixin
 from .serializers import ProductSerializer, CategorySerializer
-from mainapp.models import Category, Product
-from ..pagination import Pagination
+from mainapp.caching import NAV_NAMESPACE, PRODUCTS_NAMESPACE
+from mainapp.exports import CONTENT_TYPES, order_export_response
+from mainapp.models import Category, Order, Product
+from mainapp.search import search_products
+from ..pagination import ConcurrentPagination, Pagination
 
 
-class CategoryList(generics.ListCreateAPIView):
+class CategoryList(ConditionalListMixin, EagerLoadingViewMixin, KeysetPaginationMixin, generics.ListCreateAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     pagination_class = Pagination
 
 
-class ProductList(generics.ListCreateAPIView):
+class ProductList(ConditionalListMixin, EagerLoadingViewMixin, KeysetPaginationMixin, generics.ListCreateAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     pagination_class = Pagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ProductFilter
+    keyset_ordering = ('category_id', 'id')
+    # products render their category, so category changes count too
+    etag_namespaces = (PRODUCTS_NAMESPACE, NAV_NAMESPACE)
+
+    def list(self, request, *args, **kwargs):
+        serializer = FastProductSerializer(request)
+        rows = serializer.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize(page))
+        return Response(serializer.serialize(rows))
+
+
+class AsyncProductList(AsyncAPIViewMixin, ProductList):
+    pagination_class = ConcurrentPagination
+
+
+class ProductFacets(generics.GenericAPIView):
+    """Product counts per category and per price bucket for the current filters, from one grouped query."""
+    queryset = Product.objects.all()
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = ProductFilter
+    price_buckets = (0, 1000, 5000, 10000, 50000)
+
+    def get_bucket_expression(self):
+        bounds = self.price_buckets
+        return models.Case(
+            *[models.When(price__gte=low, price__lt=high, then=models.Value(index))
+              for index, (low, high) in enumerate(zip(bounds, bounds[1:]))],
+            default=models.Value(len(bounds) - 1),
+            output_field=models.IntegerField(),
+        )
+
+    def get(self, request, *args, **kwargs):
+        rows = self.filter_queryset(self.get_queryset()).order_by().annotate(
+            bucket=self.get_bucket_expression()
+        ).values('category__slug', 'category__name', 'bucket').annotate(count=models.Count('id'))
+        categories, buckets = {}, [0] * len(self.price_buckets)
+        for row in rows:
+            facet = categories.setdefault(
+                row['category__slug'], {'slug': row['category__slug'], 'name': row['category__name'], 'count': 0}
+            )
+            facet['count'] += row['count']
+            buckets[row['bucket']] += row['count']
+        bounds = self.price_buckets + (None,)
+        return Response({
+            'categories': sorted(categories.values(), key=lambda facet: facet['slug']),
+            'price': [{'min': low, 'max': high, 'count': count}
+                      for low, high, count in zip(bounds, bounds[1:], buckets)],
+        })
+
+
+class ProductSearch(APIView):
+    default_limit = 20
+    max_limit = 100
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = min(max(int(request.query_params.get('limit', self.default_limit)), 1), self.max_limit)
+        except ValueError:
+            limit = self.default_limit
+        prefix = request.query_params.get('prefix', 'true').lower() not in ('0', 'false', 'no')
+        ids = search_products(request.query_params.get('q', ''), limit, prefix)
+        serializer = FastProductSerializer(request)
+        rows = {row['id']: row for row in serializer.values(Product.objects.filter(pk__in=ids))}
+        return Response({'results': serializer.serialize(rows[pk] for pk in ids if pk in rows)})
+
+
+class OrderExport(generics.GenericAPIView):
+    """Staff only: streams the filtered orders as CSV, or JSON lines with ?type=jsonl."""
+    queryset = Order.objects.all()
+    permission_classes = [permissions.IsAdminUser]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = OrderExportFilter
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.query_params.get('type', 'csv')
+        if fmt not in CONTENT_TYPES:
+            return Response({'type': [f'one of {", ".join(CONTENT_TYPES)}']}, status=400)
+        return order_export_response(self.filter_queryset(self.get_queryset()), fmt)
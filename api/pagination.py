@@ -1,6 +1,155 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from mainapp.concurrency import run_concurrently
 
 
 class Pagination(PageNumberPagination):
     page_size = 4
     page_query_param = 'page'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class ConcurrentPagination(Pagination):
+    """Runs the COUNT and the page query at the same time instead of one after the other."""
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        try:
+            number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            number = 0
+        if not page_size or number < 1:
+            # 'last' and invalid numbers need the count first
+            return super().paginate_queryset(queryset, request, view)
+        offset = (number - 1) * page_size
+        count, rows = run_concurrently(queryset.count, lambda: list(queryset[offset:offset + page_size]))
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = count
+        try:
+            paginator.validate_number(number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=number, message=str(exc)))
+        self.page = Page(rows, number, paginator)
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        self.request = request
+        return rows
+
+
+class KeysetPagination(BasePagination):
+    """
+    Forward-only cursor pagination on a unique ordering, e.g. ('category_id', 'id').
+
+    Each page is a plain ``WHERE (key) > (cursor) ORDER BY key LIMIT n`` query,
+    so deep pages cost the same as the first one and rows inserted mid-crawl
+    never shift pages. The total count is only computed when asked for with
+    ``?count=true``.
+    """
+    ordering = ('id',)
+    page_size = 4
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, ordering=None):
+        if ordering:
+            self.ordering = tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = queryset.count() if self._wants_count(request) else None
+        position = self.decode_cursor(request, queryset.model)
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(position))
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def _wants_count(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes')
+
+    def _after(self, position):
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+        condition = None
+        for field, value in reversed(list(zip(self.ordering, position))):
+            greater = Q(**{f'{field}__gt': value})
+            condition = greater if condition is None else greater | (Q(**{field: value}) & condition)
+        if len(position) > 1:
+            # redundant bound on the leading column so the index range scan starts at the cursor
+            condition &= Q(**{f'{self.ordering[0]}__gte': position[0]})
+        return condition
+
+    def decode_cursor(self, request, model):
+        """Returns the cursor's position converted to the ordering fields' types, or raises NotFound."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            return [self._to_python(model, field, value) for field, value in zip(self.ordering, position)]
+        except (TypeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def _to_python(model, field, value):
+        # encode_cursor writes ints as numbers and Decimals/dates as strings
+        if value is None or isinstance(value, (bool, dict, list, float)):
+            raise TypeError(field)
+        return model._meta.get_field(field).to_python(value)
+
+    def encode_cursor(self, instance):
+        if isinstance(instance, dict):
+            position = [instance[field] for field in self.ordering]
+        else:
+            position = [getattr(instance, field) for field in self.ordering]
+        return base64.urlsafe_b64encode(json.dumps(position, default=str).encode()).decode()
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        fields = [('next', self.get_next_link()), ('results', data)]
+        if self.count is not None:
+            fields.insert(0, ('count', self.count))
+        return Response(OrderedDict(fields))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {'type': 'integer', 'example': 123},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,160 @@
+import json
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from mainapp.cart import set_cart_quantities
+from mainapp.models import Category, Product
+from mainapp.stock import reserve_stock
+from mainapp.tests import ShopTestCase
+from .main.fast_serializers import FastProductSerializer
+from .main.serializers import CartProductSerializer, GetProductOfCategorySerializer, ProductSerializer
+
+
+class ApiQueryCountTests(ShopTestCase):
+    """Every endpoint runs the same number of queries however many rows it returns."""
+
+    def add_products(self, count=10):
+        category = Category.objects.create(name='Столы', slug='tables')
+        for i in range(count):
+            Product.objects.create(category=category, title=f'Лампа-стол {i}', slug=f'table-{i}', content='Лампа',
+                                   price=1000 + i)
+
+    def fill_cart(self):
+        set_cart_quantities(self.cart, {product: 1 for product in Product.objects.all()})
+
+    def test_product_list(self):
+        self.assertConstantQueries('/api/product/?page_size=100', self.add_products)
+
+    def test_product_list_cursor(self):
+        self.assertConstantQueries('/api/product/?pagination=cursor&page_size=100', self.add_products)
+
+    def test_product_filter(self):
+        self.assertConstantQueries('/api/product/?price_min=0&ordering=price&page_size=100', self.add_products)
+
+    def test_product_search(self):
+        self.assertConstantQueries('/api/product/search/?q=лампа', self.add_products)
+
+    def test_product_facets(self):
+        self.assertConstantQueries('/api/product/facets/', self.add_products)
+
+    def test_category_list(self):
+        self.assertConstantQueries('/api/category/?page_size=100', lambda: [
+            Category.objects.create(name=f'Категория {i}', slug=f'category-{i}') for i in range(5)
+        ])
+
+    def test_cart_list(self):
+        set_cart_quantities(self.cart, {self.products[0]: 1})
+        self.assertConstantQueries('/api/cart/', self.fill_cart)
+
+    def test_cart_detail(self):
+        set_cart_quantities(self.cart, {self.products[0]: 1})
+        self.assertConstantQueries(f'/api/cart/{self.cart.pk}/', self.fill_cart)
+
+    def test_current_cart(self):
+        set_cart_quantities(self.cart, {self.products[0]: 1})
+        self.assertConstantQueries('/api/cart/current_cart/', self.fill_cart)
+
+    def test_cart_bulk(self):
+        def post(products):
+            items = [{'product_slug': product.slug, 'qty': 1} for product in products]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/cart/bulk/', json.dumps({'items': items}),
+                                            content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        post(self.products[:1])
+        expected = post(self.products[1:2])
+        self.assertEqual(post(self.products[2:]), expected)
+
+    def test_nested_serializers(self):
+        categories = GetProductOfCategorySerializer.setup_eager_loading(Category.objects.all())
+        with self.assertNumQueries(2):
+            GetProductOfCategorySerializer(categories, many=True).data
+        set_cart_quantities(self.cart, {product: 1 for product in self.products})
+        items = CartProductSerializer.setup_eager_loading(self.cart.products.all())
+        with self.assertNumQueries(1):
+            CartProductSerializer(items, many=True).data
+
+
+class FastSerializerParityTests(ShopTestCase):
+    """FastProductSerializer renders exactly what ProductSerializer does."""
+
+    def assertParity(self, queryset):
+        request = APIRequestFactory().get('/api/product/')
+        slow = ProductSerializer(queryset.select_related('category'), many=True, context={'request': request}).data
+        fast = FastProductSerializer(request)
+        self.assertEqual(json.dumps(fast.serialize(fast.values(queryset))), json.dumps(slow))
+
+    def test_parity(self):
+        Product.objects.filter(pk=self.products[0].pk).update(image='product/2024/lamp 0.jpg', stock=0)
+        Product.objects.filter(pk=self.products[1].pk).update(price='99999.99', stock=5, content=None)
+        Category.objects.filter(pk=self.category.pk).update(image='category/2024/lamps.png', image_hash='abc')
+        self.assertParity(Product.objects.order_by('pk'))
+
+    def test_parity_without_request(self):
+        fast = FastProductSerializer()
+        slow = ProductSerializer(Product.objects.order_by('pk'), many=True).data
+        self.assertEqual(json.dumps(fast.serialize(fast.values(Product.objects.order_by('pk')))), json.dumps(slow))
+
+    def test_fields_follow_product_serializer(self):
+        self.assertEqual(
+            list(FastProductSerializer().to_representation(
+                FastProductSerializer().values(Product.objects.all()).first()
+            )),
+            list(ProductSerializer().fields),
+        )
+
+    def test_product_list_matches_serializer(self):
+        response = self.client.get('/api/product/?page_size=100')
+        request = APIRequestFactory().get('/api/product/')
+        expected = ProductSerializer(Product.objects.select_related('category'), many=True,
+                                     context={'request': request}).data
+        by_id = lambda product: product['id']
+        self.assertEqual(sorted(response.json()['results'], key=by_id), sorted(json.loads(json.dumps(expected)), key=by_id))
+
+
+class ConditionalListTests(ShopTestCase):
+
+    def setUp(self):
+        # stays anonymous, so there are no session and user lookups either
+        self.client.logout()
+
+    def assertNotModified(self, path):
+        etag = self.client.get(path)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        return etag
+
+    def test_product_list_not_modified(self):
+        self.assertNotModified('/api/product/')
+
+    def test_category_list_not_modified(self):
+        self.assertNotModified('/api/category/?page_size=10')
+
+    def test_etag_depends_on_query(self):
+        etag = self.client.get('/api/product/')['ETag']
+        self.assertEqual(self.client.get('/api/product/?page=2', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_changes_invalidate(self):
+        changes = [
+            lambda: Product.objects.filter(pk=self.products[0].pk).first().save(),
+            lambda: self.products[1].delete(),
+            lambda: Category.objects.get(pk=self.category.pk).save(),
+        ]
+        for change in changes:
+            etag = self.assertNotModified('/api/product/')
+            change()
+            self.assertEqual(self.client.get('/api/product/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_stock_change_invalidates(self):
+        etag = self.assertNotModified('/api/product/')
+        Product.objects.filter(pk=self.products[0].pk).update(stock=1)
+        set_cart_quantities(self.cart, {Product.objects.get(pk=self.products[0].pk): 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_stock(self.cart)
+        self.assertEqual(self.client.get('/api/product/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
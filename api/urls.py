@@ -1,14 +1,23 @@
+from django.conf import settings
 from django.urls import path
 from rest_framework.routers import SimpleRouter
 
 from .cart.views import CartViewSet
 from .main.views import *
 
-main_router = SimpleRouter()
-urlpatterns = [
-    path('product/', ProductList.as_view()),
-    path('category/', CategoryList.as_view()),
 
-]
-main_router.register('cart', CartViewSet, basename='cart')
-urlpatterns += main_router.urls
+def get_urlpatterns(async_views=False):
+    main_router = SimpleRouter()
+    urlpatterns = [
+        path('product/', (AsyncProductList if async_views else ProductList).as_view()),
+        path('product/search/', ProductSearch.as_view()),
+        path('product/facets/', ProductFacets.as_view()),
+        path('category/', CategoryList.as_view()),
+        path('order/export/', OrderExport.as_view()),
+
+    ]
+    main_router.register('cart', CartViewSet, basename='cart')
+    return urlpatterns + main_router.urls
+
+
+urlpatterns = get_urlpatterns(getattr(settings, 'ASYNC_VIEWS', False))
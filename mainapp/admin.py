@@ -1,9 +1,68 @@
 from django.contrib import admin
+from mainapp.exports import order_export_response
 from mainapp.models import *
+from mainapp.stock import cancel_order
+
+
+@admin.action(description='Отменить выбранные заказы')
+def cancel_orders(modeladmin, request, queryset):
+    for order in queryset:
+        cancel_order(order)
+
+
+@admin.action(description='Выгрузить выбранные заказы в CSV')
+def export_orders_csv(modeladmin, request, queryset):
+    return order_export_response(queryset, 'csv')
+
+
+@admin.action(description='Выгрузить выбранные заказы в JSONL')
+def export_orders_jsonl(modeladmin, request, queryset):
+    return order_export_response(queryset, 'jsonl')
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables with millions of rows: no unfiltered COUNT(*), no full <select>s."""
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class OrderAdmin(LargeTableAdmin):
+    actions = [cancel_orders, export_orders_csv, export_orders_jsonl]
+    list_display = ('id', 'customer', 'status', 'buying_type', 'created_date', 'order_date')
+    list_filter = ('status', 'buying_type', 'created_date')
+    list_select_related = ('customer__user',)
+    raw_id_fields = ('customer', 'cart')
+
+
+class ArchivedOrderAdmin(LargeTableAdmin):
+    list_display = ('id', 'customer', 'status', 'created_date', 'archived_at')
+    list_filter = ('status', 'created_date')
+    list_select_related = ('customer__user',)
+    raw_id_fields = ('customer',)
+
+
+class CartAdmin(LargeTableAdmin):
+    list_display = ('id', 'owner', 'number_of_products', 'final_price', 'in_order')
+    list_filter = ('in_order',)
+    list_select_related = ('owner__user',)
+    raw_id_fields = ('owner',)
+
+
+class CartProductAdmin(LargeTableAdmin):
+    list_display = ('id', 'cart_id', 'product', 'qty', 'final_price')
+    list_select_related = ('product__category',)
+    raw_id_fields = ('cart', 'product', 'owner')
+
+
+class CustomerAdmin(admin.ModelAdmin):
+    list_select_related = ('user',)
+    raw_id_fields = ('user', 'orders')
+
 
 admin.site.register(Category)
-admin.site.register(CartProduct)
-admin.site.register(Cart)
-admin.site.register(Customer)
-admin.site.register(Order)
+admin.site.register(CartProduct, CartProductAdmin)
+admin.site.register(Cart, CartAdmin)
+admin.site.register(Customer, CustomerAdmin)
+admin.site.register(Order, OrderAdmin)
+admin.site.register(ArchivedOrder, ArchivedOrderAdmin)
 admin.site.register(Product)
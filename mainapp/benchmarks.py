@@ -0,0 +1,350 @@
+"""
+Benchmark suite for the shop's request paths, driven by ``manage.py bench_suite``.
+
+``seed`` builds the same data set for the same arguments, ``run`` requests
+every page and API endpoint through the test client or a local WSGI server and
+records latency percentiles, query counts and peak allocated memory, and
+``compare`` flags regressions between two saved runs.
+"""
+import json
+import math
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+import urllib.error
+import urllib.request
+from collections import namedtuple
+from datetime import date
+from decimal import Decimal
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.wsgi import get_wsgi_application
+from django.db import connection, connections, transaction
+from django.db.backends.signals import connection_created
+from django.http import HttpRequest
+from django.middleware.csrf import get_token
+from django.test import Client
+
+from mainapp.cart import set_cart_quantities
+from mainapp.history import cart_snapshot
+from mainapp.models import Cart, CartProduct, Category, Customer, Order, OrderEvent, Product
+from mainapp.search import index_products
+
+PREFIX = 'bench-suite'
+PASSWORD = 'bench-suite-password'
+WORDS = ('red', 'blue', 'green', 'steel', 'wooden', 'large', 'small', 'classic', 'modern', 'lamp', 'chair',
+         'table', 'phone', 'case', 'cable', 'bag', 'shoe', 'watch', 'cup', 'book')
+PERCENTILES = (50, 90, 99)
+
+Endpoint = namedtuple('Endpoint', 'name path method data user content_type prepare',
+                      defaults=('get', None, 'customer', None, None))
+
+
+def clear():
+    users = User.objects.filter(username__startswith=f'{PREFIX}-')
+    OrderEvent.objects.filter(order__customer__user__in=users).delete()
+    Order.objects.filter(customer__user__in=users).delete()
+    Cart.objects.filter(owner__user__in=users).delete()
+    users.delete()
+    Category.objects.filter(slug__startswith=f'{PREFIX}-').delete()
+
+
+def seed(categories=10, products=1000, customers=20, orders=5, cart_items=3, seed=0):
+    """Replaces the benchmark data with a fresh, deterministic set."""
+    rnd = random.Random(seed)
+    clear()
+    with transaction.atomic():
+        category_list = [Category.objects.create(name=f'{PREFIX} {i}', slug=f'{PREFIX}-{i}')
+                         for i in range(categories)]
+        Product.objects.bulk_create(
+            Product(category=category_list[i % categories], slug=f'{PREFIX}-{i}',
+                    title=' '.join(rnd.choices(WORDS, k=3)), content=' '.join(rnd.choices(WORDS, k=12)),
+                    price=Decimal(rnd.randint(100, 100_000)) / 100)
+            for i in range(products)
+        )
+        product_list = list(Product.objects.filter(category__in=category_list).order_by('pk'))
+        index_products(product_list)
+
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(User(username=f'{PREFIX}-{i}', password=password) for i in range(customers))
+        users = User.objects.filter(username__startswith=f'{PREFIX}-').order_by('pk')
+        Customer.objects.bulk_create(Customer(user=user, phone='0', address=PREFIX) for user in users)
+        # for the staff-only endpoints; created after the customers so it doesn't get one
+        User.objects.create(username=f'{PREFIX}-staff', password=password, is_staff=True)
+
+        items, order_list = [], []
+        for customer in Customer.objects.filter(user__in=users).order_by('pk'):
+            for number in range(orders + 1):
+                in_order = number < orders
+                cart = Cart(owner=customer, in_order=in_order, number_of_products=0, final_price=0)
+                lines = [(product, rnd.randint(1, 3)) for product in rnd.sample(product_list, cart_items)]
+                cart.number_of_products = sum(qty for _, qty in lines)
+                cart.final_price = sum(qty * product.price for product, qty in lines)
+                cart.save()
+                cart_lines = [CartProduct(owner=customer, cart=cart, product=product, qty=qty,
+                                          final_price=qty * product.price) for product, qty in lines]
+                items += cart_lines
+                if in_order:
+                    order_list.append(Order(customer=customer, cart=cart, first_name=PREFIX, phone='0',
+                                            address=PREFIX, order_date=date(2030, 1, 1),
+                                            snapshot=cart_snapshot(cart, cart_lines)))
+        CartProduct.objects.bulk_create(items)
+        Order.objects.bulk_create(order_list)
+    return {'categories': categories, 'products': products, 'customers': customers, 'orders': orders,
+            'cart_items': cart_items, 'seed': seed}
+
+
+def get_endpoints():
+    """
+    Every url of mainapp.urls and api.urls, against the seeded data, and the users
+    to log in as: ``Endpoint.user`` is 'customer', 'staff' or None for anonymous.
+    """
+    category = Category.objects.filter(slug__startswith=f'{PREFIX}-').order_by('pk').first()
+    product = Product.objects.filter(category=category).order_by('pk').first()
+    customer = Customer.objects.filter(user__username__startswith=f'{PREFIX}-').order_by('pk').first()
+    user = customer.user
+    staff = User.objects.get(username=f'{PREFIX}-staff')
+    cart, _ = Cart.objects.get_or_create(owner=customer, in_order=False,
+                                         defaults={'number_of_products': 0, 'final_price': 0})
+    word = product.title.split()[0]
+    order_form = {'first_name': PREFIX, 'phone': '0', 'address': PREFIX, 'buying_type': Order.BUYING_TYPE_SELF,
+                  'order_date': '2030-01-01', 'comment': ''}
+
+    def fill_cart(client):
+        open_cart, _ = Cart.objects.get_or_create(owner=customer, in_order=False,
+                                                  defaults={'number_of_products': 0, 'final_price': 0})
+        set_cart_quantities(open_cart, {product: 1})
+
+    return [
+        Endpoint('home', '/'),
+        Endpoint('category', f'/category/{category.slug}/'),
+        Endpoint('product', f'/products/{product.slug}/'),
+        Endpoint('product, anonymous', f'/products/{product.slug}/', user=None),
+        Endpoint('cart', '/cart/'),
+        Endpoint('add to cart', f'/add-to-cart/{product.slug}/'),
+        Endpoint('change qty', f'/change-qty-in-cart/{product.slug}/', 'post', {'qty': 2}),
+        Endpoint('delete from cart', f'/delete-from-cart/{product.slug}/', prepare=fill_cart),
+        Endpoint('checkout', '/checkout/'),
+        Endpoint('profile', '/profile/'),
+        Endpoint('login page', '/login/', user=None),
+        Endpoint('login', '/login/', 'post', {'username': user.username, 'password': PASSWORD}, user=None),
+        Endpoint('logout', '/logout/', user=None, prepare=lambda client: client.force_login(user)),
+        Endpoint('registration page', '/registration/', user=None),
+        Endpoint('instrumentation', '/instrumentation/', user='staff'),
+        Endpoint('api product list', '/api/product/'),
+        Endpoint('api product list, cursor', '/api/product/?pagination=cursor'),
+        Endpoint('api product filter', f'/api/product/?category={category.slug}&price_min=10&ordering=price'),
+        Endpoint('api product search', f'/api/product/search/?q={word}'),
+        Endpoint('api product facets', f'/api/product/facets/?category={category.slug}'),
+        Endpoint('api category list', '/api/category/'),
+        Endpoint('api cart list', '/api/cart/'),
+        Endpoint('api cart detail', f'/api/cart/{cart.pk}/'),
+        Endpoint('api current cart', '/api/cart/current_cart/'),
+        Endpoint('api cart bulk', '/api/cart/bulk/', 'post',
+                 json.dumps({'items': [{'product_slug': product.slug, 'qty': 1}]}), content_type='application/json'),
+        Endpoint('api order export', '/api/order/export/', user='staff'),
+        Endpoint('api order export, jsonl', '/api/order/export/?type=jsonl', user='staff'),
+        # last, it closes the open cart
+        Endpoint('make order', '/make-order/', 'post', order_form, prepare=fill_cart),
+    ], {'customer': user, 'staff': staff}
+
+
+class QueryCounter:
+    """Counts queries on every connection, including the ones a WSGI server thread opens."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, sender=None, connection=None, **kwargs):
+        for conn in [connection] if connection is not None else connections.all():
+            if self not in conn.execute_wrappers:
+                conn.execute_wrappers.append(self)
+
+    def __enter__(self):
+        self.install()
+        connection_created.connect(self.install)
+        return self
+
+    def __exit__(self, *exc_info):
+        connection_created.disconnect(self.install)
+        for conn in connections.all():
+            if self in conn.execute_wrappers:
+                conn.execute_wrappers.remove(self)
+
+
+class _Response:
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class WsgiClient:
+    """The bits of the test client the suite uses, over HTTP to a local server."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(_NoRedirect)
+        request = HttpRequest()
+        self.csrf_token = get_token(request)
+        self.cookies = {settings.CSRF_COOKIE_NAME: request.META['CSRF_COOKIE']}
+
+    def force_login(self, user):
+        client = Client()
+        client.force_login(user)
+        self.cookies[settings.SESSION_COOKIE_NAME] = client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def get(self, path, **extra):
+        return self._request(path, extra)
+
+    def post(self, path, data, content_type=None, **extra):
+        if content_type is None:
+            data, content_type = urlencode(data), 'application/x-www-form-urlencoded'
+        return self._request(path, extra, data.encode(), content_type)
+
+    def _request(self, path, extra, body=None, content_type=None):
+        request = urllib.request.Request(self.base_url + path, data=body)
+        for key, value in extra.items():
+            # test client style HTTP_* keys
+            request.add_header(key[5:].replace('_', '-').title(), value)
+        request.add_header('Cookie', '; '.join(f'{name}={value}' for name, value in self.cookies.items()))
+        request.add_header('X-CSRFToken', self.csrf_token)
+        if content_type:
+            request.add_header('Content-Type', content_type)
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                status, headers = response.status, response.headers
+        except urllib.error.HTTPError as exc:
+            status, headers = exc.code, exc.headers
+        for header in headers.get_all('Set-Cookie') or ():
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        return _Response(status)
+
+
+class _QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+def _percentile(timings, percent):
+    return timings[max(0, math.ceil(len(timings) * percent / 100) - 1)]
+
+
+def _request(client, endpoint):
+    # the cart views redirect back to the referer
+    extra = {'HTTP_REFERER': '/cart/'}
+    if endpoint.method == 'post':
+        if endpoint.content_type:
+            return client.post(endpoint.path, endpoint.data, content_type=endpoint.content_type, **extra)
+        return client.post(endpoint.path, endpoint.data, **extra)
+    response = client.get(endpoint.path, **extra)
+    if getattr(response, 'streaming', False):
+        # the exports run their query while streaming, time that too
+        b''.join(response.streaming_content)
+    return response
+
+
+def run(iterations=30, warmup=3, wsgi=False, names=None):
+    endpoints, users = get_endpoints()
+    if names:
+        endpoints = [endpoint for endpoint in endpoints if endpoint.name in names]
+    server = None
+    if wsgi:
+        server = make_server('127.0.0.1', 0, get_wsgi_application(), handler_class=_QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+
+    def new_client():
+        return WsgiClient(base_url) if wsgi else Client()
+
+    clients = {}
+    for role, user in users.items():
+        clients[role] = new_client()
+        clients[role].force_login(user)
+    results = {}
+    try:
+        with QueryCounter() as counter:
+            for endpoint in endpoints:
+                timings, queries, statuses, peak = [], [], set(), 0
+                for iteration in range(warmup + iterations + 1):
+                    client = clients[endpoint.user] if endpoint.user else new_client()
+                    if endpoint.prepare:
+                        endpoint.prepare(client)
+                    # the last round only measures memory, tracing slows the requests down
+                    traced = iteration == warmup + iterations
+                    if traced:
+                        tracemalloc.start()
+                    before = counter.count
+                    start = time.perf_counter()
+                    response = _request(client, endpoint)
+                    elapsed = (time.perf_counter() - start) * 1000
+                    if traced:
+                        peak = tracemalloc.get_traced_memory()[1]
+                        tracemalloc.stop()
+                    elif iteration >= warmup:
+                        timings.append(elapsed)
+                        queries.append(counter.count - before)
+                        statuses.add(response.status_code)
+                timings.sort()
+                results[endpoint.name] = {
+                    'method': endpoint.method.upper(),
+                    'path': endpoint.path,
+                    'status': sorted(statuses),
+                    'mean_ms': round(statistics.mean(timings), 3),
+                    **{f'p{percent}_ms': round(_percentile(timings, percent), 3) for percent in PERCENTILES},
+                    'queries': max(queries),
+                    'peak_kib': round(peak / 1024, 1),
+                }
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'driver': 'wsgi' if wsgi else 'test client',
+            'iterations': iterations,
+        },
+        'endpoints': results,
+    }
+
+
+def compare(base, new, threshold=0.1, min_ms=0.5, min_kib=64):
+    """Returns (rows, regressions) for two ``run`` results; rows are (endpoint, metric, base, new, flagged)."""
+    rows, regressions = [], []
+    for name, current in new['endpoints'].items():
+        previous = base['endpoints'].get(name)
+        if previous is None:
+            continue
+        for metric, slack in (('p50_ms', min_ms), ('p99_ms', min_ms), ('queries', 0), ('peak_kib', min_kib)):
+            old, value = previous[metric], current[metric]
+            if metric == 'queries':
+                flagged = value > old
+            else:
+                flagged = value > old * (1 + threshold) and value - old > slack
+            rows.append((name, metric, old, value, flagged))
+            if flagged:
+                regressions.append(f'{name} {metric}: {old} -> {value}')
+    return rows, regressions
@@ -0,0 +1,108 @@
+"""
+Versioned caching of the catalog and of cart contents.
+
+Every cached value lives under a key that embeds the current version of its
+namespace, so invalidation is a single version bump and stale entries simply
+expire. Works with any backend that implements ``add``/``incr`` atomically
+(local-memory, Redis).
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from mainapp.cart import SessionCart
+from mainapp.models import CartProduct, Category, Product
+
+CATALOG_CACHE_TIMEOUT = 60 * 60
+CART_CACHE_TIMEOUT = 60 * 15
+
+NAV_NAMESPACE = 'catalog:nav'
+# bumped on any product change; cached cart contents embed product data
+PRODUCTS_NAMESPACE = 'catalog:products'
+
+
+def get_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def category_namespace(category_id):
+    return f'catalog:category:{category_id}'
+
+
+def product_namespace(slug):
+    return f'catalog:product:{slug}'
+
+
+def cart_namespace(cart_id):
+    return f'cart:{cart_id}'
+
+
+def get_version(namespace):
+    cache = get_cache()
+    key = f'{namespace}:version'
+    version = cache.get(key)
+    if version is None:
+        # start from a timestamp so an evicted counter never reuses old keys
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(namespace):
+    cache = get_cache()
+    try:
+        cache.incr(f'{namespace}:version')
+    except ValueError:
+        cache.set(f'{namespace}:version', time.time_ns(), None)
+
+
+def bump_versions(namespaces):
+    """Bumps many namespaces in one round trip, for bulk changes that skip the model signals."""
+    version = time.time_ns()
+    get_cache().set_many({f'{namespace}:version': version for namespace in namespaces}, None)
+
+
+def versions_etag(namespaces, key=''):
+    """
+    ETag over the current versions of ``namespaces``: it changes on every save, delete
+    or bulk change the namespaces cover, without reading the rows themselves.
+    """
+    parts = [key, *(get_version(namespace) for namespace in namespaces)]
+    return '"%s"' % hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+
+
+def cached(namespace, name, factory, timeout=CATALOG_CACHE_TIMEOUT):
+    cache = get_cache()
+    key = f'{namespace}:{get_version(namespace)}:{name}'
+    value = cache.get(key)
+    if value is None:
+        value = factory()
+        cache.set(key, value, timeout)
+    return value
+
+
+def get_category_nav():
+    return cached(NAV_NAMESPACE, 'list', lambda: list(Category.objects.all()))
+
+
+def get_category(slug):
+    return cached(NAV_NAMESPACE, f'category:{slug}', lambda: Category.objects.filter(slug=slug).first())
+
+
+def get_category_products(category):
+    return cached(category_namespace(category.pk), 'products', lambda: list(category.product_set.all()))
+
+
+def get_product(slug):
+    return cached(product_namespace(slug), 'object', lambda: Product.objects.filter(slug=slug).first())
+
+
+def get_cart_items(cart):
+    if isinstance(cart, SessionCart):
+        # anonymous carts live in the session, there are no rows to cache
+        return cart.items()
+    items = CartProduct.objects.filter(cart=cart).select_related('product').order_by('id')
+    name = f'items:{get_version(PRODUCTS_NAMESPACE)}'
+    return cached(cart_namespace(cart.pk), name, lambda: list(items), CART_CACHE_TIMEOUT)
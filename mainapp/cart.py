@@ -0,0 +1,225 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from mainapp.models import Cart, CartProduct, Customer, Product
+from mainapp.utils import apply_cart_delta
+
+CART_SESSION_KEY = '_cart_id'
+ANONYMOUS_CART_SESSION_KEY = '_anonymous_cart'
+CART_CACHE_TIMEOUT = 60 * 60 * 24
+# keeps qty * price within the 9 digits of CartProduct.final_price
+MAX_CART_QTY = getattr(settings, 'MAX_CART_QTY', 999)
+
+
+class SessionCartStore:
+    """Keeps the id of the active cart in the user's session."""
+
+    def get(self, request):
+        return request.session.get(CART_SESSION_KEY)
+
+    def set(self, request, cart_id):
+        request.session[CART_SESSION_KEY] = cart_id
+
+    def delete(self, request):
+        request.session.pop(CART_SESSION_KEY, None)
+
+
+class CacheCartStore:
+    """Keeps the id of the active cart in a cache backend, keyed by user."""
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def _key(request):
+        return f'cart:user:{request.user.pk}'
+
+    def get(self, request):
+        return self.cache.get(self._key(request))
+
+    def set(self, request, cart_id):
+        self.cache.set(self._key(request), cart_id, CART_CACHE_TIMEOUT)
+
+    def delete(self, request):
+        self.cache.delete(self._key(request))
+
+
+def get_cart_store():
+    if getattr(settings, 'CART_STORE', 'session') == 'cache':
+        return CacheCartStore(getattr(settings, 'CART_STORE_CACHE_ALIAS', 'default'))
+    return SessionCartStore()
+
+
+def lookup_cart(request):
+    """
+    The read-only half of ``resolve_cart``: (cart, customer) when the request needs
+    no writes to resolve them, i.e. an anonymous visitor or a stored open cart,
+    otherwise None. Safe to run off the request thread.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return None, None
+    cart_id = get_cart_store().get(request)
+    if cart_id:
+        cart = Cart.objects.select_related('owner').filter(id=cart_id, owner__user=user, in_order=False).first()
+        if cart:
+            return cart, cart.owner
+    return None
+
+
+def _load_cart(request):
+    found = lookup_cart(request)
+    if found is not None:
+        return found
+    user, store = request.user, get_cart_store()
+    customer = Customer.objects.filter(user=user).first()
+    if not customer:
+        customer = Customer.objects.create(user=user)
+    # unique_open_cart turns a concurrent create into a lookup of the winner's cart
+    cart, _ = Cart.objects.get_or_create(owner=customer, in_order=False,
+                                         defaults={'final_price': 0, 'number_of_products': 0})
+    store.set(request, cart.id)
+    return cart, customer
+
+
+def resolve_cart(request, found=None):
+    """
+    Returns (cart, customer) for the request, resolving them at most once. ``found`` is
+    the result of a ``lookup_cart`` that already ran, e.g. in a worker thread.
+    """
+    if not hasattr(request, '_cart_cache'):
+        request._cart_cache = found if found is not None else _load_cart(request)
+    return request._cart_cache
+
+
+def invalidate_cart(request):
+    """Forgets the active cart, e.g. after checkout or logout."""
+    if hasattr(request, '_cart_cache'):
+        del request._cart_cache
+    if request.user.is_authenticated:
+        get_cart_store().delete(request)
+
+
+class SessionCartItem:
+
+    def __init__(self, product, qty):
+        self.product = product
+        self.product_id = product.pk
+        self.qty = qty
+        self.final_price = qty * product.price
+
+
+class SessionCart:
+    """
+    Cart of an anonymous visitor, kept in the session as ``{product id: qty}``.
+    Browsing and filling it writes no Customer/Cart rows; it is moved into the
+    persistent cart by ``merge_session_cart`` on login.
+    """
+    pk = id = None
+
+    def __init__(self, session):
+        self.session = session
+        self._items = None
+
+    @property
+    def quantities(self):
+        return self.session.get(ANONYMOUS_CART_SESSION_KEY, {})
+
+    def set_qty(self, product, qty):
+        quantities = dict(self.quantities)
+        if qty > 0:
+            quantities[str(product.pk)] = qty
+        else:
+            quantities.pop(str(product.pk), None)
+        self.session[ANONYMOUS_CART_SESSION_KEY] = quantities
+        self._items = None
+
+    def add(self, product):
+        if str(product.pk) not in self.quantities:
+            self.set_qty(product, 1)
+
+    def remove(self, product):
+        self.set_qty(product, 0)
+
+    def items(self):
+        if self._items is None:
+            quantities = self.quantities
+            products = Product.objects.in_bulk([int(pk) for pk in quantities])
+            self._items = [
+                SessionCartItem(products[int(pk)], qty) for pk, qty in quantities.items() if int(pk) in products
+            ]
+        return self._items
+
+    @property
+    def number_of_products(self):
+        return sum(item.qty for item in self.items())
+
+    @property
+    def final_price(self):
+        return sum(item.final_price for item in self.items())
+
+
+def set_cart_quantities(cart, quantities, combine=None):
+    """
+    Sets ``{product: qty}`` on a persistent cart with one bulk query per kind of
+    change; qty 0 removes the product. With ``combine``, a product that is already
+    in the cart gets ``combine(current_qty, qty)`` instead of ``qty``. Quantities
+    are capped at the stock on hand, like the cart page does.
+    """
+    with transaction.atomic():
+        existing = {
+            item.product_id: item for item in CartProduct.objects.select_for_update().filter(
+                cart=cart, product__in=list(quantities)
+            ).order_by('pk')
+        }
+        to_create, to_update, to_delete = [], [], []
+        qty_delta = price_delta = 0
+        for product, qty in quantities.items():
+            item = existing.get(product.pk)
+            if item is not None:
+                qty_delta -= item.qty
+                price_delta -= item.final_price
+                if combine is not None:
+                    qty = combine(item.qty, qty)
+            if product.stock is not None:
+                qty = min(qty, product.stock)
+            if qty <= 0:
+                if item is not None:
+                    to_delete.append(item.pk)
+                continue
+            if item is None:
+                item = CartProduct(cart=cart, product=product, owner=cart.owner)
+                to_create.append(item)
+            else:
+                to_update.append(item)
+            item.qty = qty
+            item.final_price = qty * product.price
+            qty_delta += item.qty
+            price_delta += item.final_price
+        CartProduct.objects.filter(pk__in=to_delete).delete()
+        CartProduct.objects.bulk_update(to_update, ['qty', 'final_price'])
+        CartProduct.objects.bulk_create(to_create)
+        apply_cart_delta(cart, qty_delta, price_delta)
+
+
+def merge_session_cart(request):
+    """
+    Moves the anonymous session cart into the user's persistent cart, called right
+    after ``login()``. A product that is in both carts keeps the larger quantity,
+    so items the visitor re-added before logging in are not doubled.
+    """
+    quantities = request.session.pop(ANONYMOUS_CART_SESSION_KEY, None)
+    # the request may have resolved the cart while it was still anonymous
+    invalidate_cart(request)
+    if not quantities:
+        return
+    products = Product.objects.in_bulk([int(pk) for pk in quantities])
+    cart, _ = resolve_cart(request)
+    set_cart_quantities(
+        cart, {products[int(pk)]: qty for pk, qty in quantities.items() if int(pk) in products}, combine=max
+    )
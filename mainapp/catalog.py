@@ -0,0 +1,161 @@
+"""
+Streaming catalog import and export for ``import_catalog``/``export_catalog``.
+
+Rows are read and written one at a time and written to the database in
+chunks, one transaction each, so memory stays flat whatever the file size.
+Imports upsert on ``slug`` and, as bulk queries skip the model signals, do
+the signal work per chunk themselves: search indexing, cache invalidation
+and queueing changed images for the image worker. Every read an import
+writes back goes to the write database, never to a lagging replica.
+"""
+import csv
+import json
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import router, transaction
+from django.utils import timezone
+
+from mainapp.caching import NAV_NAMESPACE, PRODUCTS_NAMESPACE, bump_versions, category_namespace, product_namespace
+from mainapp.models import Category, ImageTask, Product
+from mainapp.search import index_products
+
+FIELDS = {
+    'category': ('slug', 'name', 'image'),
+    'product': ('slug', 'category', 'title', 'content', 'price', 'stock', 'image'),
+}
+MODELS = {'category': Category, 'product': Product}
+
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def write_rows(rows, stream, fmt, fields):
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        for row in rows:
+            stream.write(json.dumps(row, ensure_ascii=False, default=str) + '\n')
+
+
+def export_rows(kind, chunk_size=2000):
+    fields = FIELDS[kind]
+    columns = ['category__slug' if field == 'category' else field for field in fields]
+    queryset = MODELS[kind].objects.order_by('pk').values_list(*columns)
+    for values in queryset.iterator(chunk_size=chunk_size):
+        yield dict(zip(fields, values))
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _clean(kind, row, categories):
+    # a column left out is left alone, an empty one is cleared
+    values = {field: '' if row[field] is None else row[field] for field in FIELDS[kind] if field in row}
+    if not values.get('slug'):
+        raise ValueError(f'{kind} without a slug: {row}')
+    if kind == 'product':
+        slug = values.pop('category', None)
+        if slug is not None:
+            if slug not in categories:
+                raise ValueError(f'product {values["slug"]}: unknown category {slug!r}')
+            values['category_id'] = categories[slug]
+        if 'price' in values:
+            values['price'] = Decimal(str(values['price']))
+        if 'stock' in values:
+            values['stock'] = int(values['stock']) if values['stock'] != '' else None
+    return values
+
+
+def import_chunk(kind, rows, categories, index=True):
+    """
+    Upserts one chunk of rows in one transaction; returns (created, updated).
+    ``categories`` maps slugs to ids and gains the new categories.
+    """
+    model = MODELS[kind]
+    db = router.db_for_write(model)
+    rows = {values['slug']: values for values in (_clean(kind, row, categories) for row in rows)}
+    now = timezone.now()
+    created, updated, fields, new_images, reindex, namespaces = [], [], set(), [], [], set()
+    with transaction.atomic(using=db):
+        existing = model.objects.using(db).in_bulk(list(rows), field_name='slug')
+        for slug, values in rows.items():
+            instance = existing.get(slug)
+            if instance is None:
+                if kind == 'product' and 'category_id' not in values:
+                    raise ValueError(f'new product {slug} without a category')
+                instance = model(**values)
+                created.append(instance)
+                changed = set(values)
+            else:
+                changed = {name for name, value in values.items() if getattr(instance, name) != value}
+                if not changed:
+                    continue
+                if kind == 'product':
+                    # a product moved to another category leaves the old one stale too
+                    namespaces.add(category_namespace(instance.category_id))
+                for name in changed:
+                    setattr(instance, name, values[name])
+                instance.updated_at = now
+                fields |= changed | {'updated_at'}
+                updated.append(instance)
+            if 'image' in changed and values['image']:
+                # rendered later by process_images, like an upload through the admin
+                instance.image_hash = ''
+                new_images.append(instance)
+                fields.add('image_hash')
+            if {'title', 'content'} & changed:
+                reindex.append(instance)
+        if updated:
+            model.objects.using(db).bulk_update(updated, sorted(fields))
+        model.objects.using(db).bulk_create(created)
+        if created and created[0].pk is None:
+            # primary keys come back from bulk_create only on PostgreSQL
+            ids = dict(model.objects.using(db).filter(
+                slug__in=[instance.slug for instance in created]
+            ).values_list('slug', 'pk'))
+            for instance in created:
+                instance.pk = ids[instance.slug]
+        content_type = ContentType.objects.get_for_model(model)
+        ImageTask.objects.using(db).bulk_create(
+            [ImageTask(content_type=content_type, object_id=instance.pk) for instance in new_images],
+            ignore_conflicts=True,
+        )
+        if kind == 'product' and index:
+            index_products(reindex)
+    changed = created + updated
+    if kind == 'product':
+        namespaces.add(PRODUCTS_NAMESPACE)
+        namespaces.update(product_namespace(product.slug) for product in changed)
+        namespaces.update(category_namespace(product.category_id) for product in changed)
+    else:
+        categories.update((category.slug, category.pk) for category in created)
+        namespaces = {NAV_NAMESPACE, *(category_namespace(category.pk) for category in changed)}
+    if changed:
+        bump_versions(namespaces)
+    return len(created), len(updated)
+
+
+def import_rows(kind, rows, chunk_size=1000, index=True):
+    """
+    Imports ``rows`` chunk by chunk, yielding (created, updated) per chunk.
+    Without ``index`` the search index is left for ``rebuild_search_index``.
+    """
+    categories = dict(Category.objects.using(router.db_for_write(Category)).values_list('slug', 'pk'))
+    for chunk in chunks(rows, chunk_size):
+        yield import_chunk(kind, chunk, categories, index)
@@ -0,0 +1,30 @@
+"""
+Runs independent ORM lookups at the same time for the async views.
+
+Each callable gets its own worker thread (``thread_sensitive=False``) and
+therefore its own database connection, so only pass read-only lookups that
+don't depend on each other or on the request's transaction.
+"""
+import asyncio
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import close_old_connections
+
+
+def _in_worker(func):
+    def run():
+        try:
+            return func()
+        finally:
+            # what request_finished does for the request thread
+            close_old_connections()
+    return run
+
+
+async def gather_sync(*funcs):
+    return await asyncio.gather(*(sync_to_async(_in_worker(func), thread_sensitive=False)() for func in funcs))
+
+
+def run_concurrently(*funcs):
+    """``gather_sync`` for sync code, e.g. a view body already running under ``sync_to_async``."""
+    return async_to_sync(gather_sync)(*funcs)
@@ -0,0 +1,90 @@
+"""
+Order history: the snapshot frozen into ``Order.snapshot`` at checkout, and
+archival of old finished orders into ``ArchivedOrder``.
+"""
+from django.core.files.storage import default_storage
+from django.db import connections, router, transaction
+
+from mainapp.images import rendition_path
+from mainapp.models import ArchivedOrder, BaseOrder, Cart, Order, cart_items_prefetch
+
+ARCHIVE_STATUSES = (BaseOrder.STATUS_COMPLETED, BaseOrder.STATUS_CANCELED)
+ARCHIVED_FIELDS = [field.attname for field in ArchivedOrder._meta.concrete_fields if field.name != 'archived_at']
+
+
+def _image_url(product):
+    if not product.image:
+        return ''
+    if product.image_hash:
+        # renditions are written by the image worker along with the hash
+        return default_storage.url(rendition_path(product, 'listing', product.image_hash))
+    return product.image.url
+
+
+def cart_snapshot(cart, items=None):
+    """Line items and totals of ``cart`` as stored in ``Order.snapshot``."""
+    if items is None:
+        items = cart.products.select_related('product').order_by('id')
+    return {
+        'items': [
+            {
+                'slug': item.product.slug,
+                'title': item.product.title,
+                'image': _image_url(item.product),
+                'price': str(item.product.price),
+                'qty': item.qty,
+                'total': str(item.final_price),
+            }
+            for item in items
+        ],
+        'qty': cart.number_of_products,
+        'total': str(cart.final_price),
+    }
+
+
+def backfill_snapshots(queryset, batch_size=500):
+    """Snapshots orders placed before snapshots existed; returns how many were filled."""
+    filled = last_pk = 0
+    db = router.db_for_write(Order)
+    queryset = queryset.using(db).filter(snapshot={}, cart__isnull=False).select_related('cart').prefetch_related(
+        cart_items_prefetch('cart__products')
+    ).order_by('pk')
+    while True:
+        # walk by pk, so a row that still matches after the update can't be picked up again
+        orders = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not orders:
+            return filled
+        last_pk = orders[-1].pk
+        for order in orders:
+            order.snapshot = cart_snapshot(order.cart, order.cart.products.all())
+        Order.objects.using(db).bulk_update(orders, ['snapshot'])
+        filled += len(orders)
+
+
+def archive_orders(before, statuses=ARCHIVE_STATUSES, batch_size=500, delete_carts=True):
+    """
+    Moves orders in ``statuses`` created before ``before`` to ArchivedOrder,
+    one transaction per batch; returns how many were moved. Orders whose
+    outbox events haven't been processed yet stay until they are.
+    """
+    archived = 0
+    db = router.db_for_write(Order)
+    queryset = Order.objects.using(db).filter(status__in=statuses, created_date__lt=before, events__isnull=True)
+    backfill_snapshots(queryset, batch_size)
+    while True:
+        with transaction.atomic(using=db):
+            batch = queryset.order_by('pk')
+            if connections[db].features.has_select_for_update_skip_locked:
+                batch = batch.select_for_update(skip_locked=True)
+            orders = list(batch[:batch_size])
+            if not orders:
+                return archived
+            ArchivedOrder.objects.using(db).bulk_create(
+                [ArchivedOrder(**{name: getattr(order, name) for name in ARCHIVED_FIELDS}) for order in orders]
+            )
+            Order.objects.using(db).filter(pk__in=[order.pk for order in orders]).delete()
+            if delete_carts:
+                # the snapshot replaces them; a cart still behind another order stays
+                Cart.objects.using(db).filter(pk__in=[order.cart_id for order in orders if order.cart_id], in_order=True,
+                                    order__isnull=True).delete()
+        archived += len(orders)
@@ -0,0 +1,109 @@
+"""
+Image renditions.
+
+Uploads are stored untouched and a task is queued (``ImageTask``). The
+``process_images`` worker renders every size in ``RENDITIONS`` to a
+deterministic path derived from the hash of the source file and then records
+that hash on the object, so reprocessing an unchanged image is a no-op.
+Until the worker got to an image, pages serve the original.
+"""
+import hashlib
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+# name: (width, height, format); format None keeps the format of the source
+RENDITIONS = {
+    'thumb': (100, 100, None),
+    'listing': (300, 300, None),
+    'detail': (600, 600, None),
+    'webp': (600, 600, 'WEBP'),
+}
+
+# widths offered in srcset; the WebP rendition is served separately
+SRCSET_RENDITIONS = ('thumb', 'listing', 'detail')
+
+FORMAT_EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+EXTENSION_FORMATS = {'jpg': 'JPEG', 'jpeg': 'JPEG', 'png': 'PNG', 'webp': 'WEBP'}
+
+
+def source_hash(field_file):
+    digest = hashlib.sha1()
+    field_file.open('rb')
+    try:
+        for chunk in field_file.chunks():
+            digest.update(chunk)
+    finally:
+        field_file.close()
+    return digest.hexdigest()
+
+
+def rendition_format(source_name, name):
+    fmt = RENDITIONS[name][2]
+    if fmt:
+        return fmt
+    ext = os.path.splitext(source_name)[1].lstrip('.').lower()
+    return EXTENSION_FORMATS.get(ext, 'PNG')
+
+
+def rendition_path(instance, name, image_hash):
+    fmt = rendition_format(instance.image.name, name)
+    return (f'renditions/{instance._meta.label_lower}/{instance.pk}/'
+            f'{name}-{image_hash[:16]}.{FORMAT_EXTENSIONS[fmt]}')
+
+
+def _exists_key(path):
+    return f'rendition:exists:{path}'
+
+
+def _exists_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+def rendition_exists(path, storage=default_storage):
+    """storage.exists() with the positive answers cached; a rendition path never changes content."""
+    if _exists_cache().get(_exists_key(path)):
+        return True
+    if storage.exists(path):
+        _exists_cache().set(_exists_key(path), True, None)
+        return True
+    return False
+
+
+def render(img, name, fmt):
+    width, height, _ = RENDITIONS[name]
+    resized = ImageOps.fit(img, (width, height), Image.ANTIALIAS)
+    if fmt == 'JPEG' and resized.mode not in ('RGB', 'L'):
+        resized = resized.convert('RGB')
+    buffer = BytesIO()
+    resized.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def process_image(instance, names=None, storage=default_storage):
+    """Renders missing renditions of ``instance.image``; returns the names it rendered."""
+    if not instance.image:
+        return []
+    image_hash = source_hash(instance.image)
+    names = names or list(RENDITIONS)
+    missing = [name for name in names if not rendition_exists(rendition_path(instance, name, image_hash), storage)]
+    if missing:
+        instance.image.open('rb')
+        try:
+            img = Image.open(instance.image)
+            img.load()
+        finally:
+            instance.image.close()
+        for name in missing:
+            fmt = rendition_format(instance.image.name, name)
+            path = storage.save(rendition_path(instance, name, image_hash), ContentFile(render(img, name, fmt)))
+            _exists_cache().set(_exists_key(path), True, None)
+    if instance.image_hash != image_hash:
+        instance.image_hash = image_hash
+        instance.save(update_fields=['image_hash', 'updated_at'])
+    return missing
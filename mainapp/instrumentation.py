@@ -0,0 +1,162 @@
+"""
+Per-request instrumentation for ``mainapp.middleware.InstrumentationMiddleware``.
+
+Records the view, DB query count and time, duplicated queries with the
+template line or code line that ran them, template render time and wall time
+of each request. The records are kept in an in-process ring buffer served by
+``InstrumentationView``; slow requests can also be sampled with cProfile.
+"""
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.template.base import Node, Template
+
+current_record = ContextVar('instrumentation_record', default=None)
+# a tag that runs a query is a dozen or so frames up; views and templates are rarely deeper than this
+ORIGIN_MAX_DEPTH = 32
+
+_buffer = None
+_buffer_lock = threading.Lock()
+_LIBRARY_PATHS = tuple({sysconfig.get_path(name) for name in ('stdlib', 'platstdlib', 'purelib', 'platlib')}) + (
+    __file__,
+)
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = deque(maxlen=getattr(settings, 'INSTRUMENTATION_BUFFER_SIZE', 500))
+    return _buffer
+
+
+def query_origin():
+    """
+    Template and line of the tag that ran the query, else the innermost project code line,
+    looking at most ``ORIGIN_MAX_DEPTH`` frames up.
+    """
+    frame, code_line = sys._getframe(2), None
+    for _ in range(ORIGIN_MAX_DEPTH):
+        if frame is None:
+            break
+        node = frame.f_locals.get('self')
+        # type(), as isinstance() would evaluate lazy objects such as request.cart
+        if issubclass(type(node), Node) and getattr(node, 'token', None) is not None and node.origin is not None:
+            return f'{node.origin.template_name or node.origin.name}:{node.token.lineno}'
+        filename = frame.f_code.co_filename
+        if code_line is None and not filename.startswith(_LIBRARY_PATHS):
+            code_line = f'{filename}:{frame.f_lineno}'
+        frame = frame.f_back
+    return code_line
+
+
+class RequestRecord:
+
+    def __init__(self, request):
+        self.request = request
+        self.view = None
+        self.queries = []
+        self.template_time = 0
+        self.start = time.perf_counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, repr(params), time.perf_counter() - start, query_origin()))
+
+    def duplicates(self):
+        counts = Counter((sql, params) for sql, params, _, _ in self.queries)
+        origins = defaultdict(set)
+        for sql, params, _, origin in self.queries:
+            if counts[sql, params] > 1:
+                origins[sql, params].add(origin)
+        return [
+            {'sql': sql, 'count': counts[sql, params], 'origins': sorted(filter(None, origins[sql, params]))}
+            for sql, params in origins
+        ]
+
+    def finish(self, response, profile=None):
+        total = time.perf_counter() - self.start
+        db_time = sum(duration for _, _, duration, _ in self.queries)
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'method': self.request.method,
+            'path': self.request.path,
+            'view': self.view,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_ms': round(db_time * 1000, 2),
+            'queries': len(self.queries),
+            'duplicates': self.duplicates(),
+            'template_ms': round(self.template_time * 1000, 2),
+            'profile': profile,
+        }
+        get_buffer().append(entry)
+        return entry
+
+
+def server_timing(entry):
+    return (f'db;dur={entry["db_ms"]};desc="{entry["queries"]} queries", '
+            f'tpl;dur={entry["template_ms"]}, total;dur={entry["total_ms"]}')
+
+
+def summary(entries):
+    """Per view request count, mean and slowest wall time, and mean query count."""
+    views = defaultdict(list)
+    for entry in entries:
+        views[entry['view']].append(entry)
+    return {
+        view: {
+            'requests': len(rows),
+            'mean_ms': round(sum(row['total_ms'] for row in rows) / len(rows), 2),
+            'max_ms': max(row['total_ms'] for row in rows),
+            'mean_queries': round(sum(row['queries'] for row in rows) / len(rows), 1),
+            'with_duplicates': sum(1 for row in rows if row['duplicates']),
+        }
+        for view, rows in views.items()
+    }
+
+
+_original_render = Template.render
+_patched = 0
+_patch_lock = threading.Lock()
+
+
+def _timed_render(self, context):
+    record = current_record.get()
+    if record is None:
+        return _original_render(self, context)
+    start = time.perf_counter()
+    try:
+        return _original_render(self, context)
+    finally:
+        record.template_time += time.perf_counter() - start
+
+
+@contextmanager
+def instrument_templates():
+    """
+    Times top-level renders while at least one instrumented request is running, and
+    restores ``Template.render`` after the last one; {% include %} and {% extends %}
+    go through _render and are counted once.
+    """
+    global _patched
+    with _patch_lock:
+        _patched += 1
+        Template.render = _timed_render
+    try:
+        yield
+    finally:
+        with _patch_lock:
+            _patched -= 1
+            if not _patched:
+                Template.render = _original_render
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from mainapp.history import ARCHIVE_STATUSES, archive_orders, backfill_snapshots
+from mainapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Moves finished orders older than --days to the order archive in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--status', action='append', dest='statuses',
+                            help=f'statuses to archive, may be repeated (default {", ".join(ARCHIVE_STATUSES)})')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--keep-carts', action='store_true', help="don't delete the archived orders' carts")
+        parser.add_argument('--backfill', action='store_true',
+                            help='only snapshot orders placed before snapshots existed, of any age')
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            filled = backfill_snapshots(Order.objects.all(), options['batch_size'])
+            self.stdout.write(f'{filled} orders snapshotted')
+            return
+        before = timezone.now() - timedelta(days=options['days'])
+        archived = archive_orders(before, options['statuses'] or ARCHIVE_STATUSES, options['batch_size'],
+                                  delete_carts=not options['keep_carts'])
+        self.stdout.write(f'{archived} orders archived')
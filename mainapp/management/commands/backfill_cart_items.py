@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from mainapp.models import CartProduct
+
+M2M_TABLE = 'mainapp_cart_products'
+
+
+class Command(BaseCommand):
+    help = (
+        'Copies cart membership from the old Cart.products join table into CartProduct.cart '
+        'and drops line items that were never linked. Run it before migrating the join table away.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if M2M_TABLE not in connection.introspection.table_names():
+            self.stdout.write(f'{M2M_TABLE} does not exist, nothing to backfill')
+            return
+        batch_size = options['batch_size']
+        moved = self._sync_carts(batch_size)
+        pruned = self._prune_unlinked(batch_size)
+        self.stdout.write(self.style.SUCCESS(f'{moved} line items moved, {pruned} unlinked line items deleted'))
+
+    @staticmethod
+    def _sync_carts(batch_size):
+        moved = 0
+        last_id = 0
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT id, cart_id, cartproduct_id FROM {M2M_TABLE} WHERE id > %s ORDER BY id LIMIT %s',
+                    [last_id, batch_size],
+                )
+                rows = cursor.fetchall()
+            if not rows:
+                return moved
+            last_id = rows[-1][0]
+            cart_ids = {item_id: cart_id for _, cart_id, item_id in rows}
+            with transaction.atomic():
+                items = list(CartProduct.objects.filter(pk__in=cart_ids).only('id', 'cart_id'))
+                changed = [item for item in items if item.cart_id != cart_ids[item.pk]]
+                for item in changed:
+                    item.cart_id = cart_ids[item.pk]
+                CartProduct.objects.bulk_update(changed, ['cart'])
+            moved += len(changed)
+
+    @staticmethod
+    def _prune_unlinked(batch_size):
+        pruned = 0
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT id FROM mainapp_cartproduct WHERE id NOT IN '
+                    f'(SELECT cartproduct_id FROM {M2M_TABLE}) ORDER BY id LIMIT %s',
+                    [batch_size],
+                )
+                ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                return pruned
+            pruned += CartProduct.objects.filter(pk__in=ids).delete()[1].get(CartProduct._meta.label, 0)
@@ -0,0 +1,49 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from mainapp.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = 'Measures add-to-cart/delete-from-cart latency; run it on two revisions to compare'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=50)
+        parser.add_argument('--rounds', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with override_settings(ALLOWED_HOSTS=['*']), transaction.atomic():
+            category = Category.objects.create(name='bench', slug='bench-add-to-cart')
+            products = Product.objects.bulk_create(
+                Product(category=category, title=f'bench {i}', slug=f'bench-add-to-cart-{i}', price=i + 1)
+                for i in range(options['products'])
+            )
+            slugs = [product.slug for product in products]
+            client = Client()
+            client.force_login(User.objects.create_user(username='bench-add-to-cart', password='bench'))
+
+            add, delete = [], []
+            for _ in range(options['rounds']):
+                for slug in slugs:
+                    add.append(self._timed(client, reverse('add_to_cart', args=(slug,))))
+                for slug in slugs:
+                    delete.append(self._timed(client, reverse('delete_from_cart', args=(slug,)), HTTP_REFERER='/cart/'))
+            self._report('add-to-cart', add)
+            self._report('delete-from-cart', delete)
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _timed(client, url, **extra):
+        start = time.perf_counter()
+        client.get(url, **extra)
+        return (time.perf_counter() - start) * 1000
+
+    def _report(self, name, timings):
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        self.stdout.write(f'{name:<20} mean {statistics.mean(timings):.2f} ms  p95 {p95:.2f} ms  n={len(timings)}')
@@ -0,0 +1,118 @@
+import asyncio
+import statistics
+import threading
+import time
+import types
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+from django.urls import include, path
+
+import api.urls
+import mainapp.urls
+from mainapp.models import Category, Product
+
+SLUG = 'bench-asgi'
+
+
+def _urlconf(async_views):
+    urlconf = types.ModuleType(f'{SLUG}-urls')
+    urlconf.urlpatterns = [
+        path('', include(mainapp.urls.get_urlpatterns(async_views))),
+        path('api/', include(api.urls.get_urlpatterns(async_views))),
+    ]
+    return urlconf
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-tests the catalog and cart read pages: sync views under WSGI against the async views '
+        'under ASGI, in process by default or against two running servers'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument('--products', type=int, default=50)
+        parser.add_argument('--wsgi-url', help='e.g. http://127.0.0.1:8000 served by gunicorn store.wsgi')
+        parser.add_argument('--asgi-url', help='e.g. http://127.0.0.1:8001 served by uvicorn store.asgi '
+                                               'with ASYNC_VIEWS = True')
+
+    def handle(self, *args, **options):
+        category = Category.objects.create(name=SLUG, slug=SLUG)
+        Product.objects.bulk_create(
+            Product(category=category, title=f'{SLUG} {i}', slug=f'{SLUG}-{i}', price=i + 1)
+            for i in range(options['products'])
+        )
+        paths = ['/', f'/category/{SLUG}/', f'/products/{SLUG}-0/', '/cart/', f'/api/product/?category={SLUG}']
+        sequence = [paths[i % len(paths)] for i in range(options['requests'])]
+        concurrency = options['concurrency']
+        try:
+            if options['wsgi_url'] or options['asgi_url']:
+                runs = [(name, lambda url=url: self._http(url, sequence, concurrency))
+                        for name, url in (('wsgi', options['wsgi_url']), ('asgi', options['asgi_url'])) if url]
+            else:
+                runs = [('wsgi, sync views', lambda: self._wsgi(sequence, concurrency)),
+                        ('asgi, async views', lambda: self._asgi(sequence, concurrency))]
+            self.stdout.write(f'{len(sequence)} requests, concurrency {concurrency}')
+            self.stdout.write(f'{"":<20}{"p50 ms":>9}{"p99 ms":>9}{"req/s":>9}{"errors":>8}')
+            for name, run in runs:
+                start = time.perf_counter()
+                results = run()
+                elapsed = time.perf_counter() - start
+                timings = sorted(timing for timing, _ in results)
+                errors = sum(1 for _, status in results if status >= 500)
+                p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+                self.stdout.write(f'{name:<20}{statistics.median(timings):>9.2f}{p99:>9.2f}'
+                                  f'{len(results) / elapsed:>9.0f}{errors:>8}')
+        finally:
+            category.delete()
+
+    @staticmethod
+    def _wsgi(sequence, concurrency):
+        local = threading.local()
+
+        def request(url):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            start = time.perf_counter()
+            response = local.client.get(url)
+            return (time.perf_counter() - start) * 1000, response.status_code
+
+        with override_settings(ALLOWED_HOSTS=['*'], ROOT_URLCONF=_urlconf(False)):
+            with ThreadPoolExecutor(concurrency) as pool:
+                return list(pool.map(request, sequence))
+
+    @staticmethod
+    def _asgi(sequence, concurrency):
+        async def run():
+            client = AsyncClient()
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def request(url):
+                async with semaphore:
+                    start = time.perf_counter()
+                    response = await client.get(url)
+                    return (time.perf_counter() - start) * 1000, response.status_code
+            return await asyncio.gather(*(request(url) for url in sequence))
+
+        with override_settings(ALLOWED_HOSTS=['*'], ROOT_URLCONF=_urlconf(True)):
+            return asyncio.run(run())
+
+    @staticmethod
+    def _http(base_url, sequence, concurrency):
+        def request(url):
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(base_url.rstrip('/') + url) as response:
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as exc:
+                status = exc.code
+            return (time.perf_counter() - start) * 1000, status
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            return list(pool.map(request, sequence))
@@ -0,0 +1,52 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from mainapp.cart import get_cart_store
+from mainapp.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = 'Prints per-page query counts with a cold and a warm cart resolution cache'
+
+    def handle(self, *args, **options):
+        with override_settings(ALLOWED_HOSTS=['*']), transaction.atomic():
+            category = Category.objects.create(name='bench', slug='bench-cart-queries')
+            product = Product.objects.create(category=category, title='bench', slug='bench-cart-queries', price=1)
+            user = User.objects.create_user(username='bench-cart-queries', password='bench')
+            client = Client()
+            client.force_login(user)
+            pages = (
+                reverse('mainapp_home'),
+                reverse('category_detail', kwargs={'slug': category.slug}),
+                reverse('products_detail', kwargs={'slug': product.slug}),
+                reverse('cart'),
+                reverse('profile'),
+            )
+            # the first hit creates the customer and the cart
+            client.get(pages[0])
+
+            self.stdout.write(f'{"page":<40}{"cold":>8}{"warm":>8}')
+            for url in pages:
+                self._forget_cart(client, user)
+                cold = self._count_queries(client, url)
+                warm = self._count_queries(client, url)
+                self.stdout.write(f'{url:<40}{cold:>8}{warm:>8}')
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _forget_cart(client, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        request.session = client.session
+        get_cart_store().delete(request)
+        request.session.save()
+
+    @staticmethod
+    def _count_queries(client, url):
+        with CaptureQueriesContext(connection) as queries:
+            client.get(url)
+        return len(queries)
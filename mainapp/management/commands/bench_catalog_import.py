@@ -0,0 +1,112 @@
+import os
+import random
+import resource
+import tempfile
+import time
+import tracemalloc
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+
+from mainapp import catalog
+from mainapp.models import Category, Product, SearchTerm
+
+SLUG = 'bench-catalog'
+WORDS = ('red', 'blue', 'steel', 'cotton', 'phone', 'lamp', 'chair', 'shoe', 'bag', 'modern', 'classic', 'mini')
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports, reimports and exports a synthetic catalog file with import_catalog/export_catalog and reports '
+        'rows per second and memory growth for each step'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--format', choices=('csv', 'jsonl'), default='csv')
+        parser.add_argument('--no-index', action='store_true', help='import without updating the search index')
+        parser.add_argument('--trace-memory', action='store_true',
+                            help='report the peak of Python allocations, slowing every step down')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        directory = tempfile.mkdtemp()
+        paths = {name: os.path.join(directory, f'{name}.{options["format"]}')
+                 for name in ('categories', 'products', 'changed', 'export')}
+        self._write(paths['categories'], 'category', self._categories(options['categories']), options['format'])
+        self._write(paths['products'], 'product', self._products(options, changed=False), options['format'])
+        self._write(paths['changed'], 'product', self._products(options, changed=True), options['format'])
+        steps = (
+            ('import categories', options['categories'], 'import_catalog', paths['categories'], 'category'),
+            ('import products', options['products'], 'import_catalog', paths['products'], 'product'),
+            ('reimport unchanged', options['products'], 'import_catalog', paths['products'], 'product'),
+            ('reimport, 10% changed', options['products'], 'import_catalog', paths['changed'], 'product'),
+            ('export products', options['products'], 'export_catalog', paths['export'], 'product'),
+        )
+        self.stdout.write(f'{"step":<24}{"rows":>10}{"seconds":>10}{"rows/s":>10}{"RSS +KiB":>10}'
+                          + (f'{"peak KiB":>10}' if options['trace_memory'] else ''))
+        try:
+            for name, rows, command, path, model in steps:
+                arguments = [command, path, '--model', model, '--chunk-size', str(options['chunk_size'])]
+                if options['no_index'] and command == 'import_catalog':
+                    arguments.append('--no-index')
+                self._step(name, rows, options, *arguments)
+        finally:
+            for path in paths.values():
+                if os.path.exists(path):
+                    os.remove(path)
+            os.rmdir(directory)
+            with connection.cursor() as cursor:
+                categories = list(Category.objects.filter(slug__startswith=SLUG).values_list('pk', flat=True))
+                if categories:
+                    placeholders = ', '.join(['%s'] * len(categories))
+                    cursor.execute(
+                        f'DELETE FROM {SearchTerm._meta.db_table} WHERE product_id IN (SELECT id FROM '
+                        f'{Product._meta.db_table} WHERE category_id IN ({placeholders}))', categories
+                    )
+                    cursor.execute(f'DELETE FROM {Product._meta.db_table} WHERE category_id IN ({placeholders})',
+                                   categories)
+            Category.objects.filter(slug__startswith=SLUG).delete()
+
+    def _step(self, name, rows, options, *command):
+        if options['trace_memory']:
+            tracemalloc.start()
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        # DEBUG keeps the last 9000 queries, bulk inserts included, which would hide flat memory
+        with override_settings(DEBUG=False), open(os.devnull, 'w') as devnull:
+            call_command(*command, stdout=devnull)
+        elapsed = time.perf_counter() - start
+        line = (f'{name:<24}{rows:>10}{elapsed:>10.2f}{rows / elapsed:>10.0f}'
+                f'{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss:>10}')
+        if options['trace_memory']:
+            line += f'{tracemalloc.get_traced_memory()[1] / 1024:>10.0f}'
+            tracemalloc.stop()
+        self.stdout.write(line)
+
+    @staticmethod
+    def _write(path, model, rows, fmt):
+        with open(path, 'w', newline='', encoding='utf-8') as stream:
+            catalog.write_rows(rows, stream, fmt, catalog.FIELDS[model])
+
+    @staticmethod
+    def _categories(count):
+        for i in range(count):
+            yield {'slug': f'{SLUG}-{i}', 'name': f'{SLUG} {i}', 'image': ''}
+
+    @staticmethod
+    def _products(options, changed):
+        rnd = random.Random(options['seed'])
+        for i in range(options['products']):
+            price = rnd.randint(100, 100_000)
+            if changed and i % 10 == 0:
+                price += 1
+            yield {
+                'slug': f'{SLUG}-{i}', 'category': f'{SLUG}-{i % options["categories"]}',
+                'title': ' '.join(rnd.choices(WORDS, k=3)), 'content': ' '.join(rnd.choices(WORDS, k=12)),
+                'price': f'{price / 100:.2f}', 'stock': rnd.choice(['', rnd.randint(0, 50)]), 'image': '',
+            }
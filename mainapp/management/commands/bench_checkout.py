@@ -0,0 +1,83 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from mainapp import outbox
+from mainapp.cart import set_cart_quantities
+from mainapp.models import Cart, Category, Customer, Order, OrderEvent, Product
+
+SLUG = 'bench-checkout'
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures checkouts/sec with the order outbox, with and without slow event handlers, '
+        'against running the same handlers inside the checkout request'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=50)
+        parser.add_argument('--handler-delay', type=float, default=50, help='ms spent by the slow handler')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        category = Category.objects.create(name=SLUG, slug=SLUG)
+        product = Product.objects.create(category=category, title=SLUG, slug=SLUG, price=100)
+        user = User.objects.create_user(SLUG)
+        customer = Customer.objects.create(user=user)
+        delay = options['handler_delay'] / 1000
+
+        def slow_handler(event):
+            time.sleep(delay)
+
+        try:
+            client = Client()
+            client.force_login(user)
+            count = options['checkouts']
+            self.stdout.write(f'{"mode":<26}{"checkouts/sec":>15}')
+            self._report('outbox', self._checkouts(client, customer, product, count))
+            outbox.register(OrderEvent.ORDER_CREATED)(slow_handler)
+            try:
+                self._report('outbox, slow handler', self._checkouts(client, customer, product, count))
+                start = time.perf_counter()
+                call_command('process_order_events', once=True, stdout=self.stdout)
+                drained = time.perf_counter() - start
+                self.stdout.write(f'{"worker drain":<26}{count * 2 / drained:>11.1f} events/sec')
+                self._report('inline, slow handler', self._checkouts(client, customer, product, count, inline=True))
+            finally:
+                outbox.unregister(OrderEvent.ORDER_CREATED, slow_handler)
+        finally:
+            OrderEvent.objects.filter(order__customer=customer).delete()
+            Order.objects.filter(customer=customer).delete()
+            Cart.objects.filter(owner=customer).delete()
+            customer.delete()
+            user.delete()
+            category.delete()
+            teardown_test_environment()
+
+    def _report(self, mode, rate):
+        self.stdout.write(f'{mode:<26}{rate:>15.1f}')
+
+    @staticmethod
+    def _checkouts(client, customer, product, count, inline=False):
+        form = {'first_name': SLUG, 'phone': '0', 'address': SLUG, 'buying_type': Order.BUYING_TYPE_SELF,
+                'order_date': '2030-01-01', 'comment': ''}
+        elapsed = 0
+        for _ in range(count):
+            cart, _ = Cart.objects.get_or_create(owner=customer, in_order=False,
+                                                 defaults={'final_price': 0, 'number_of_products': 0})
+            set_cart_quantities(cart, {product: 1})
+            start = time.perf_counter()
+            client.post(reverse('make_order'), form)
+            if inline:
+                # what checkout would cost if the side effects ran in the request
+                for event in OrderEvent.objects.filter(order__cart=cart):
+                    outbox.dispatch(event)
+                    event.delete()
+            elapsed += time.perf_counter() - start
+        return count / elapsed
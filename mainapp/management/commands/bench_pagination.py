@@ -0,0 +1,72 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.test import APIRequestFactory
+
+from api.main.views import ProductList
+from api.pagination import KeysetPagination
+from mainapp.models import Category, Product
+
+SLUG = 'bench-pagination'
+
+
+class Command(BaseCommand):
+    help = 'Seeds products and compares deep page latency of page-number and keyset pagination on /api/product/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1_000_000)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--keep', action='store_true', help='keep the seeded products for another run')
+
+    def handle(self, *args, **options):
+        category = Category.objects.filter(slug=SLUG).first()
+        if category is None:
+            category = Category.objects.create(name=SLUG, slug=SLUG)
+            self._seed(category, options['products'])
+        try:
+            self._compare(category, options)
+        finally:
+            if not options['keep']:
+                with connection.cursor() as cursor:
+                    cursor.execute(f'DELETE FROM {Product._meta.db_table} WHERE category_id = %s', [category.pk])
+                category.delete()
+
+    def _seed(self, category, count, batch_size=10_000):
+        for start in range(0, count, batch_size):
+            with transaction.atomic():
+                Product.objects.bulk_create(
+                    Product(category=category, title=f'bench {i}', slug=f'{SLUG}-{i}', price=i % 1000 + 1)
+                    for i in range(start, min(start + batch_size, count))
+                )
+        self.stdout.write(f'seeded {count} products')
+
+    def _compare(self, category, options):
+        factory = APIRequestFactory()
+        view = ProductList.as_view()
+        page_size = options['page_size']
+        products = Product.objects.filter(category=category).order_by(*ProductList.keyset_ordering)
+        total = products.count()
+        self.stdout.write(f'{"depth":>8}{"page number p50":>18}{"keyset p50":>14}')
+        for depth in (0, 0.5, 0.99):
+            offset = int(total * depth) // page_size * page_size
+            page = offset // page_size + 1
+            by_number = self._timed(view, factory.get('/api/product/', {'page': page, 'page_size': page_size}),
+                                    options['repeat'])
+            params = {'pagination': 'cursor', 'page_size': page_size}
+            if offset:
+                params['cursor'] = KeysetPagination(ProductList.keyset_ordering).encode_cursor(products[offset - 1])
+            by_cursor = self._timed(view, factory.get('/api/product/', params), options['repeat'])
+            self.stdout.write(f'{depth:>8.0%}{by_number:>15.2f} ms{by_cursor:>11.2f} ms')
+
+    @staticmethod
+    def _timed(view, request, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = view(request)
+            response.render()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
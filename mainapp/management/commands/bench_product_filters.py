@@ -0,0 +1,72 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.http import QueryDict
+
+from api.main.filters import ProductFilter
+from mainapp.models import Category, Product
+
+SLUG = 'bench-filters'
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds products, checks with EXPLAIN that the product list filters use the composite '
+        'indexes and reports their latency'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200_000)
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        categories = self._seed(options['products'], options['categories'])
+        try:
+            slug = categories[len(categories) // 2].slug
+            cases = (
+                ('category + price range', f'category={slug}&price_min=100&price_max=200&ordering=price',
+                 'product_category_price_idx'),
+                ('category, keyset order', f'category={slug}', 'product_category_id_idx'),
+            )
+            failed = []
+            for name, params, index in cases:
+                queryset = ProductFilter(QueryDict(params), queryset=Product.objects.all()).qs
+                if 'ordering' not in params:
+                    queryset = queryset.order_by('category_id', 'id')
+                queryset = queryset[:20]
+                plan = queryset.explain()
+                timings = []
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    list(queryset.all())
+                    timings.append((time.perf_counter() - start) * 1000)
+                used = index in plan
+                self.stdout.write(f'{name:<26} p50 {statistics.median(timings):7.2f} ms  '
+                                  f'{index}: {"used" if used else "NOT USED"}')
+                if not used:
+                    failed.append(f'{name}:\n{plan}')
+            if failed:
+                raise CommandError('expected indexes are not used\n' + '\n'.join(failed))
+        finally:
+            with connection.cursor() as cursor:
+                ids = [category.pk for category in categories]
+                placeholders = ', '.join(['%s'] * len(ids))
+                cursor.execute(f'DELETE FROM {Product._meta.db_table} WHERE category_id IN ({placeholders})', ids)
+            Category.objects.filter(slug__startswith=SLUG).delete()
+
+    @staticmethod
+    def _seed(count, category_count, batch_size=10_000):
+        categories = [Category.objects.create(name=f'{SLUG} {i}', slug=f'{SLUG}-{i}') for i in range(category_count)]
+        for start in range(0, count, batch_size):
+            with transaction.atomic():
+                Product.objects.bulk_create(
+                    Product(category=categories[i % category_count], title=f'bench {i}', slug=f'{SLUG}-{i}',
+                            price=(i * 7919) % 100_000 / 100)
+                    for i in range(start, min(start + batch_size, count))
+                )
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Product._meta.db_table}')
+        return categories
@@ -0,0 +1,69 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from mainapp.models import Category, Product, SearchTerm
+from mainapp.search import index_products, search_products
+
+SLUG = 'bench-search'
+
+
+class Command(BaseCommand):
+    help = 'Grows a synthetic catalog step by step and reports search latency at each size'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000', help='comma separated catalog sizes')
+        parser.add_argument('--vocabulary', type=int, default=20000)
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        words = [f'w{i:05d}' for i in range(options['vocabulary'])]
+        category = Category.objects.create(name=SLUG, slug=SLUG)
+        try:
+            seeded = 0
+            self.stdout.write(f'{"products":>10}{"exact p50":>12}{"two terms p50":>16}{"prefix p50":>13}')
+            for size in sorted(int(size) for size in options['sizes'].split(',')):
+                self._seed(category, seeded, size, words, rnd)
+                seeded = size
+                queries = [rnd.choice(words) for _ in range(options['queries'])]
+                exact = self._timed(lambda q: search_products(q, prefix=False), queries)
+                pairs = self._timed(lambda q: search_products(f'{q} {rnd.choice(words)}', prefix=False), queries)
+                prefix = self._timed(lambda q: search_products(q[:4]), queries)
+                self.stdout.write(f'{size:>10}{exact:>9.2f} ms{pairs:>13.2f} ms{prefix:>10.2f} ms')
+        finally:
+            with connection.cursor() as cursor:
+                products = Product._meta.db_table
+                cursor.execute(
+                    f'DELETE FROM {SearchTerm._meta.db_table} WHERE product_id IN '
+                    f'(SELECT id FROM {products} WHERE category_id = %s)', [category.pk]
+                )
+                cursor.execute(f'DELETE FROM {products} WHERE category_id = %s', [category.pk])
+            category.delete()
+
+    @staticmethod
+    def _seed(category, start, stop, words, rnd, batch_size=5000):
+        for batch_start in range(start, stop, batch_size):
+            with transaction.atomic():
+                products = Product.objects.bulk_create(
+                    Product(category=category, slug=f'{SLUG}-{i}', price=1,
+                            title=' '.join(rnd.choices(words, k=3)), content=' '.join(rnd.choices(words, k=12)))
+                    for i in range(batch_start, min(batch_start + batch_size, stop))
+                )
+                if products and products[0].pk is None:
+                    # backends that don't return ids from bulk inserts
+                    products = Product.objects.filter(slug__in=[product.slug for product in products])
+                index_products(products)
+
+    @staticmethod
+    def _timed(search, queries):
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            search(query)
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,47 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.test import APIRequestFactory
+
+from api.main.fast_serializers import FastProductSerializer
+from api.main.serializers import ProductSerializer
+from mainapp.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = 'Checks FastProductSerializer output against ProductSerializer and compares objects/sec'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        request = APIRequestFactory().get('/api/product/')
+        with transaction.atomic():
+            category = Category.objects.create(name='bench', slug='bench-serializers', image='category/bench.jpg')
+            Product.objects.bulk_create(
+                Product(category=category, title=f'bench {i}', slug=f'bench-serializers-{i}', content='text',
+                        image=f'product/bench {i}.jpg' if i % 2 else '', price=f'{i}.5')
+                for i in range(options['products'])
+            )
+            queryset = Product.objects.filter(category=category)
+
+            def slow():
+                return ProductSerializer(queryset.select_related('category'), many=True,
+                                         context={'request': request}).data
+
+            def fast():
+                serializer = FastProductSerializer(request)
+                return serializer.serialize(serializer.values(queryset))
+
+            if json.dumps(slow()) != json.dumps(fast()):
+                raise CommandError('FastProductSerializer output differs from ProductSerializer')
+            for name, serialize in (('ProductSerializer', slow), ('FastProductSerializer', fast)):
+                start = time.perf_counter()
+                for _ in range(options['repeat']):
+                    serialize()
+                rate = options['products'] * options['repeat'] / (time.perf_counter() - start)
+                self.stdout.write(f'{name:<24}{rate:>12.0f} objects/sec')
+            transaction.set_rollback(True)
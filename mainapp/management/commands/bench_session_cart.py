@@ -0,0 +1,73 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from mainapp.cart import set_cart_quantities
+from mainapp.models import Cart, CartProduct, Category, Customer, Product
+
+SLUG = 'bench-session-cart'
+PASSWORD = 'bench-session-cart-password'
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class Command(BaseCommand):
+    help = (
+        'Fills a cart anonymously and as a logged in user, compares the database writes, '
+        'then logs in and checks how the session cart was merged'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        category = Category.objects.create(name=SLUG, slug=SLUG)
+        products = [Product.objects.create(category=category, title=f'{SLUG} {i}', slug=f'{SLUG}-{i}', price=10 + i)
+                    for i in range(max(options['products'], 2))]
+        users = [User.objects.create_user(f'{SLUG}-{name}', password=PASSWORD) for name in ('anonymous', 'customer')]
+        try:
+            anonymous, customer = Client(), Client()
+            customer.force_login(users[1])
+            for name, client in (('anonymous', anonymous), ('logged in', customer)):
+                with CaptureQueriesContext(connection) as queries:
+                    self._fill(client, products)
+                writes = [query['sql'] for query in queries.captured_queries
+                          if query['sql'].startswith(WRITES) and 'django_session' not in query['sql']]
+                self.stdout.write(f'{name:<10} {len(queries.captured_queries):4} queries, {len(writes):3} row writes')
+
+            # the saved cart already has the first two products, one with a larger quantity
+            owner = Customer.objects.create(user=users[0])
+            cart = Cart.objects.create(owner=owner, final_price=0, number_of_products=0)
+            set_cart_quantities(cart, {products[0]: 3, products[1]: 1})
+            with CaptureQueriesContext(connection) as queries:
+                anonymous.post(reverse('login'), {'username': users[0].username, 'password': PASSWORD})
+            self.stdout.write(f'{"merge":<10} {len(queries.captured_queries):4} queries')
+
+            expected = {products[0].pk: 3, products[1].pk: 5}
+            expected.update({product.pk: 1 for product in products[2:]})
+            merged = dict(CartProduct.objects.filter(cart=cart).values_list('product_id', 'qty'))
+            cart.refresh_from_db()
+            if merged != expected:
+                raise CommandError(f'merged quantities {merged}, expected {expected}')
+            if cart.number_of_products != sum(expected.values()):
+                raise CommandError(f'cart total {cart.number_of_products}, expected {sum(expected.values())}')
+            if Cart.objects.filter(owner=owner).count() != 1:
+                raise CommandError('merge created a second cart')
+            self.stdout.write(self.style.SUCCESS('session cart merged'))
+        finally:
+            Cart.objects.filter(owner__user__in=users).delete()
+            Customer.objects.filter(user__in=users).delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            category.delete()
+            teardown_test_environment()
+
+    @staticmethod
+    def _fill(client, products):
+        for product in products:
+            client.get(reverse('add_to_cart', args=(product.slug,)))
+        # the first product gets a smaller quantity than in the saved cart, the second a larger one
+        client.post(reverse('change_qty_in_cart', args=(products[0].slug,)), {'qty': 1})
+        client.post(reverse('change_qty_in_cart', args=(products[1].slug,)), {'qty': 5})
@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from mainapp import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a deterministic shop, requests every page and API endpoint and saves latency percentiles, '
+        'query counts and peak memory as JSON; --compare flags regressions between two saved runs'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='write the results to this JSON file')
+        parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help='compare two saved runs')
+        parser.add_argument('--threshold', type=float, default=0.1, help='allowed relative slowdown')
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--wsgi', action='store_true', help='go through a local WSGI server')
+        parser.add_argument('--endpoint', action='append', dest='endpoints', help='only this one, may be repeated')
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--customers', type=int, default=20)
+        parser.add_argument('--orders', type=int, default=5, help='order history per customer')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--keep', action='store_true', help='keep the seeded data')
+
+    def handle(self, *args, **options):
+        if options['compare']:
+            return self._compare(*options['compare'], options['threshold'])
+        data = benchmarks.seed(options['categories'], options['products'], options['customers'],
+                               options['orders'], seed=options['seed'])
+        try:
+            with override_settings(ALLOWED_HOSTS=['*']):
+                results = benchmarks.run(options['iterations'], options['warmup'], options['wsgi'],
+                                         options['endpoints'])
+        finally:
+            if not options['keep']:
+                benchmarks.clear()
+        results['meta']['data'] = data
+        self.stdout.write(f'{"endpoint":<28}{"status":>8}{"p50 ms":>9}{"p90 ms":>9}{"p99 ms":>9}'
+                          f'{"queries":>9}{"peak KiB":>10}')
+        for name, row in results['endpoints'].items():
+            self.stdout.write(f'{name:<28}{",".join(map(str, row["status"])):>8}{row["p50_ms"]:>9.2f}'
+                              f'{row["p90_ms"]:>9.2f}{row["p99_ms"]:>9.2f}{row["queries"]:>9}{row["peak_kib"]:>10.1f}')
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+            self.stdout.write(f'saved to {options["output"]}')
+
+    def _compare(self, base_path, new_path, threshold):
+        with open(base_path) as base, open(new_path) as new:
+            rows, regressions = benchmarks.compare(json.load(base), json.load(new), threshold)
+        for name, metric, old, value, flagged in rows:
+            line = f'{name:<28}{metric:<10}{old:>10}{value:>10}'
+            self.stdout.write(self.style.ERROR(line + '  REGRESSION') if flagged else line)
+        if regressions:
+            raise CommandError(f'{len(regressions)} regressions:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('no regressions'))
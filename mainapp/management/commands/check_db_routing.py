@@ -0,0 +1,87 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from mainapp.models import Category, Customer, Product
+from mainapp.routers import PRIMARY, get_replicas
+
+SLUG = 'check-db-routing'
+# queries reading the catalog tables first, not cart queries joining them
+CATALOG_TABLES = tuple(f'FROM {quote}{model._meta.db_table}{quote}' for model in (Category, Product) for quote in '"`')
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class Command(BaseCommand):
+    help = (
+        'Requests each page through PrimaryReplicaRouter and checks which database its queries went to. '
+        'Every replica must hold the schema, e.g. two SQLite files both migrated.'
+    )
+
+    def handle(self, *args, **options):
+        replicas = get_replicas()
+        if not replicas:
+            raise CommandError('no replica databases configured')
+        # seed every database with the same ids, standing in for replication
+        category = Category.objects.create(name=SLUG, slug=SLUG)
+        product = Product.objects.create(category=category, title=SLUG, slug=SLUG, price=1)
+        for alias in replicas:
+            Category.objects.using(alias).create(pk=category.pk, name=SLUG, slug=SLUG)
+            Product.objects.using(alias).create(pk=product.pk, category_id=category.pk, title=SLUG, slug=SLUG, price=1)
+        user = User.objects.create_user(SLUG)
+        Customer.objects.create(user=user)
+        client = Client()
+        client.force_login(user)
+        caches = dict(settings.CACHES, **{SLUG: {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+        failed = []
+        try:
+            with override_settings(ALLOWED_HOSTS=['*'], CACHES=caches, CATALOG_CACHE_ALIAS=SLUG):
+                with override_settings(PRIMARY_STICKY_SECONDS=0):
+                    # the first page creates the user's cart, which would pin the next ones
+                    client.get(reverse('cart'))
+                checks = (
+                    ('home', 'get', reverse('mainapp_home'), 'replica'),
+                    ('category', 'get', reverse('category_detail', args=(SLUG,)), 'replica'),
+                    ('product', 'get', reverse('products_detail', args=(SLUG,)), 'replica'),
+                    ('product list api', 'get', '/api/product/', 'replica'),
+                    # reads the product before its first write, so only its writes are checked
+                    ('add to cart', 'get', reverse('add_to_cart', args=(SLUG,)), None),
+                    ('product after a write', 'get', reverse('products_detail', args=(SLUG,)), 'primary'),
+                )
+                for name, method, url, expected in checks:
+                    failed += self._check(client, name, method, url, expected, replicas)
+                with override_settings(PRIMARY_STICKY_SECONDS=0):
+                    client.get(reverse('delete_from_cart', args=(SLUG,)), HTTP_REFERER='/cart/')
+                    failed += self._check(client, 'product, window over', 'get',
+                                          reverse('products_detail', args=(SLUG,)), 'replica', replicas)
+        finally:
+            user.delete()
+            for alias in [PRIMARY, *replicas]:
+                Category.objects.using(alias).filter(slug=SLUG).delete()
+        if failed:
+            raise CommandError('queries went to the wrong database: ' + ', '.join(failed))
+        self.stdout.write(self.style.SUCCESS('all pages routed as expected'))
+
+    def _check(self, client, name, method, url, expected, replicas):
+        contexts = {alias: CaptureQueriesContext(connections[alias]) for alias in [PRIMARY, *replicas]}
+        for context in contexts.values():
+            context.__enter__()
+        try:
+            getattr(client, method)(url)
+        finally:
+            for context in contexts.values():
+                context.__exit__(None, None, None)
+        catalog = {
+            alias: sum(1 for query in context.captured_queries if any(t in query['sql'] for t in CATALOG_TABLES))
+            for alias, context in contexts.items()
+        }
+        replica_writes = sum(1 for alias in replicas for query in contexts[alias].captured_queries
+                             if query['sql'].startswith(WRITES))
+        on_replicas = sum(catalog[alias] for alias in replicas)
+        self.stdout.write(f'{name:<24} primary {len(contexts[PRIMARY]):3} queries ({catalog[PRIMARY]} catalog), '
+                          f'replicas {sum(len(contexts[alias]) for alias in replicas):3} queries')
+        routed = 'replica' if on_replicas and not catalog[PRIMARY] else 'primary' if catalog[PRIMARY] else None
+        return [] if not replica_writes and expected in (None, routed) else [name]
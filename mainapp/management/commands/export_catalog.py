@@ -0,0 +1,26 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from mainapp import catalog
+from mainapp.management.commands.import_catalog import get_format
+
+
+class Command(BaseCommand):
+    help = 'Streams categories or products to a CSV or JSONL file (- for stdout) in the import_catalog layout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--model', choices=sorted(catalog.MODELS), default='product')
+        parser.add_argument('--format', choices=('csv', 'jsonl'))
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path, fmt = options['path'], get_format(options['path'], options['format'])
+        stream = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        try:
+            catalog.write_rows(catalog.export_rows(options['model'], options['chunk_size']), stream, fmt,
+                               catalog.FIELDS[options['model']])
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
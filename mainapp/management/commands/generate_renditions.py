@@ -0,0 +1,56 @@
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connections, router
+
+from mainapp.images import RENDITIONS, process_image
+
+MODELS = ('mainapp.Category', 'mainapp.Product')
+
+logger = logging.getLogger(__name__)
+
+
+def _init_worker():
+    if not apps.ready:
+        django.setup()
+
+
+def _render_chunk(label, ids, names):
+    rendered = 0
+    model = apps.get_model(label)
+    # process_image saves image_hash back, so read from the database it writes to
+    for instance in model.objects.using(router.db_for_write(model)).filter(pk__in=ids):
+        try:
+            rendered += len(process_image(instance, names))
+        except (OSError, ValueError):
+            logger.exception('%s %s: rendering failed', label, instance.pk)
+    return rendered
+
+
+class Command(BaseCommand):
+    help = 'Pre-generates image renditions for all categories and products using a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None, help='defaults to the number of CPUs')
+        parser.add_argument('--chunk-size', type=int, default=200)
+        parser.add_argument('--rendition', action='append', choices=list(RENDITIONS), dest='names',
+                            help='limit to the given rendition, may be repeated')
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(RENDITIONS)
+        chunk_size = options['chunk_size']
+        chunks = []
+        for label in MODELS:
+            ids = list(apps.get_model(label).objects.exclude(image='').order_by('pk').values_list('pk', flat=True))
+            chunks += [(label, ids[start:start + chunk_size]) for start in range(0, len(ids), chunk_size)]
+        # close before forking so the workers don't inherit open connections
+        connections.close_all()
+        rendered = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=_init_worker) as pool:
+            futures = [pool.submit(_render_chunk, label, ids, names) for label, ids in chunks]
+            for future in as_completed(futures):
+                rendered += future.result()
+        self.stdout.write(self.style.SUCCESS(f'{rendered} renditions rendered'))
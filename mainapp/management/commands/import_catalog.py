@@ -0,0 +1,48 @@
+import sys
+from decimal import InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mainapp import catalog
+
+
+def get_format(path, fmt):
+    fmt = fmt or ('csv' if path.endswith('.csv') else 'jsonl' if path.endswith(('.jsonl', '.json')) else None)
+    if fmt is None:
+        raise CommandError(f'pass --format for {path}')
+    return fmt
+
+
+class Command(BaseCommand):
+    help = (
+        'Upserts categories or products keyed on slug from a CSV or JSONL file (- for stdin) in chunks, '
+        'one transaction each. Images are paths already in the media storage, rendered by process_images.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--model', choices=sorted(catalog.MODELS), default='product')
+        parser.add_argument('--format', choices=('csv', 'jsonl'))
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--no-index', action='store_false', dest='index',
+                            help='leave the search index to rebuild_search_index, for the largest imports')
+
+    def handle(self, *args, **options):
+        path, fmt = options['path'], get_format(options['path'], options['format'])
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        created = updated = 0
+        try:
+            rows = catalog.read_rows(stream, fmt)
+            for number, (chunk_created, chunk_updated) in enumerate(
+                    catalog.import_rows(options['model'], rows, options['chunk_size'], options['index']), 1):
+                created += chunk_created
+                updated += chunk_updated
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'chunk {number}: {created} created, {updated} updated')
+        except (ValueError, KeyError, InvalidOperation) as exc:
+            # earlier chunks stay imported; the upsert makes a rerun safe
+            raise CommandError(f'{exc} (after {created} created, {updated} updated)')
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.stdout.write(self.style.SUCCESS(f'{created} created, {updated} updated'))
@@ -0,0 +1,62 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from mainapp.images import process_image
+from mainapp.models import ImageTask
+
+
+class Command(BaseCommand):
+    help = 'Renders image renditions for queued uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='drain the queue and exit')
+        parser.add_argument('--sleep', type=float, default=5, help='seconds to wait when the queue is empty')
+        parser.add_argument('--max-attempts', type=int, default=5)
+
+    def handle(self, *args, **options):
+        while True:
+            processed = 0
+            while self._process_next(options['max_attempts']):
+                processed += 1
+            if processed:
+                self.stdout.write(f'{processed} images processed')
+            if options['once']:
+                return
+            time.sleep(options['sleep'])
+
+    @staticmethod
+    def _claim(db, max_attempts):
+        tasks = ImageTask.objects.using(db).filter(
+            run_after__lte=timezone.now(), attempts__lt=max_attempts
+        ).order_by('run_after')
+        if connections[db].features.has_select_for_update_skip_locked:
+            tasks = tasks.select_for_update(skip_locked=True)
+        return tasks.first()
+
+    def _process_next(self, max_attempts):
+        # the queue is read and written on the same database, never on a replica
+        db = router.db_for_write(ImageTask)
+        with transaction.atomic(using=db):
+            task = self._claim(db, max_attempts)
+            if task is None:
+                return False
+            try:
+                with transaction.atomic(using=db):
+                    if task.target is not None:
+                        process_image(task.target)
+            except Exception as exc:
+                attempts = task.attempts + 1
+                ImageTask.objects.using(db).filter(pk=task.pk).update(
+                    attempts=attempts,
+                    last_error=repr(exc),
+                    run_after=timezone.now() + timedelta(seconds=2 ** attempts),
+                )
+                self.stderr.write(f'{task}: {exc!r}')
+            else:
+                # a re-upload while we were busy moves run_after and keeps the task queued
+                ImageTask.objects.using(db).filter(pk=task.pk, run_after=task.run_after).delete()
+        return True
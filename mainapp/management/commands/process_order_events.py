@@ -0,0 +1,76 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections, models, router, transaction
+from django.utils import timezone
+
+from mainapp import outbox
+from mainapp.models import OrderEvent
+
+
+class Command(BaseCommand):
+    help = 'Runs the handlers for order events queued at checkout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='drain the outbox and exit')
+        parser.add_argument('--sleep', type=float, default=1, help='seconds to wait when the outbox is empty')
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-attempts', type=int, default=8)
+        parser.add_argument('--lease', type=int, default=300,
+                            help='seconds before events claimed by a worker that died are retried')
+
+    def handle(self, *args, **options):
+        while True:
+            processed = 0
+            while True:
+                claimed = self._process_batch(options['batch_size'], options['max_attempts'], options['lease'])
+                if not claimed:
+                    break
+                processed += claimed
+            if processed:
+                self.stdout.write(f'{processed} order events processed')
+            if options['once']:
+                return
+            time.sleep(options['sleep'])
+
+    @staticmethod
+    def _claim(db, batch_size, max_attempts, lease):
+        """
+        Takes a batch in its own short transaction: moving run_after past the lease
+        hides the events from other workers while the handlers run, without holding
+        row locks, and brings them back if this worker dies.
+        """
+        now = timezone.now()
+        with transaction.atomic(using=db):
+            events = OrderEvent.objects.using(db).filter(
+                run_after__lte=now, attempts__lt=max_attempts
+            ).order_by('run_after', 'pk')
+            if connections[db].features.has_select_for_update_skip_locked:
+                events = events.select_for_update(skip_locked=True)
+            events = list(events[:batch_size])
+            OrderEvent.objects.using(db).filter(pk__in=[event.pk for event in events]).update(
+                attempts=models.F('attempts') + 1, run_after=now + timedelta(seconds=lease)
+            )
+        return events
+
+    def _process_batch(self, batch_size, max_attempts, lease):
+        # the outbox is read and written on the same database, never on a replica
+        db = router.db_for_write(OrderEvent)
+        events = self._claim(db, batch_size, max_attempts, lease)
+        done = []
+        for event in events:
+            try:
+                with transaction.atomic(using=db):
+                    outbox.dispatch(event)
+            except Exception as exc:
+                attempts = event.attempts + 1
+                OrderEvent.objects.using(db).filter(pk=event.pk).update(
+                    last_error=repr(exc),
+                    run_after=timezone.now() + timedelta(seconds=2 ** attempts),
+                )
+                self.stderr.write(f'{event}: {exc!r}')
+            else:
+                done.append(event.pk)
+        OrderEvent.objects.using(db).filter(pk__in=done).delete()
+        return len(events)
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from mainapp.models import Product
+from mainapp.search import index_products
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the product search index in batches, e.g. after bulk imports that skip signals'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch, indexed = [], 0
+        for product in Product.objects.only('id', 'title', 'content').order_by('pk').iterator(
+                chunk_size=options['batch_size']):
+            batch.append(product)
+            if len(batch) == options['batch_size']:
+                index_products(batch)
+                indexed += len(batch)
+                batch = []
+        if batch:
+            index_products(batch)
+            indexed += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'{indexed} products indexed'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from mainapp.models import Cart, cart_totals_expressions
+
+
+class Command(BaseCommand):
+    help = 'Checks the stored cart totals against the line items and repairs them in one UPDATE'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='only report carts with wrong totals')
+
+    def handle(self, *args, **options):
+        mismatched = Cart.objects.with_wrong_totals()
+        if options['check']:
+            self.stdout.write(f'{mismatched.count()} carts with wrong totals')
+            return
+        updated = Cart.objects.filter(pk__in=mismatched.values('pk')).update(**cart_totals_expressions())
+        self.stdout.write(self.style.SUCCESS(f'{updated} carts repaired'))
@@ -0,0 +1,81 @@
+import random
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, models
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from mainapp.models import Cart, CartProduct, Category, Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Hammers the add/change/delete cart endpoints for one user from many threads and '
+        'checks that no duplicate line items appear and the cart totals stay correct. '
+        'Needs a database that allows concurrent writers (e.g. PostgreSQL).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=50, help='requests per thread')
+        parser.add_argument('--products', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        category = Category.objects.create(name='stress', slug='stress-cart')
+        products = [
+            Product.objects.create(category=category, title=f'stress {i}', slug=f'stress-cart-{i}', price=i + 1)
+            for i in range(options['products'])
+        ]
+        user = User.objects.create_user(username='stress-cart', password='stress')
+        errors = []
+        try:
+            with override_settings(ALLOWED_HOSTS=['*']):
+                threads = [
+                    threading.Thread(target=self._worker, args=(user, products, options, seed, errors))
+                    for seed in range(options['seed'], options['seed'] + options['threads'])
+                ]
+                start = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - start
+
+            total = options['threads'] * options['requests']
+            carts = Cart.objects.filter(owner__user=user, in_order=False)
+            duplicates = CartProduct.objects.filter(cart__in=carts).values('cart', 'product').annotate(
+                n=models.Count('id')
+            ).filter(n__gt=1).count()
+            self.stdout.write(f'{total} requests in {elapsed:.2f}s ({total / elapsed:.0f} req/s), {len(errors)} errors')
+            self.stdout.write(f'open carts: {carts.count()}, duplicate line items: {duplicates}, '
+                              f'carts with wrong totals: {carts.with_wrong_totals().count()}')
+            for error in errors[:5]:
+                self.stderr.write(repr(error))
+        finally:
+            user.delete()
+            category.delete()
+
+    @staticmethod
+    def _worker(user, products, options, seed, errors):
+        rnd = random.Random(seed)
+        client = Client()
+        client.force_login(user)
+        try:
+            for _ in range(options['requests']):
+                slug = rnd.choice(products).slug
+                action = rnd.choice(('add', 'add', 'qty', 'delete'))
+                try:
+                    if action == 'add':
+                        client.get(reverse('add_to_cart', args=(slug,)))
+                    elif action == 'qty':
+                        client.post(reverse('change_qty_in_cart', args=(slug,)), {'qty': rnd.randint(1, 5)})
+                    else:
+                        client.get(reverse('delete_from_cart', args=(slug,)), HTTP_REFERER='/cart/')
+                except Exception as exc:
+                    errors.append(exc)
+        finally:
+            connection.close()
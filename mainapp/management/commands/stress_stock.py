@@ -0,0 +1,91 @@
+import random
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from mainapp.cart import set_cart_quantities
+from mainapp.models import Cart, CartProduct, Category, Customer, Order, OrderEvent, Product
+
+SLUG = 'stress-stock'
+
+
+class Command(BaseCommand):
+    help = (
+        'Checks out carts holding the same hot product from many threads and verifies that stock '
+        'is never oversold. Needs a database that allows concurrent writers (e.g. PostgreSQL).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--checkouts', type=int, default=20, help='checkout attempts per thread')
+        parser.add_argument('--stock', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        category = Category.objects.create(name=SLUG, slug=SLUG)
+        hot = Product.objects.create(category=category, title='hot', slug=f'{SLUG}-hot', price=10,
+                                     stock=options['stock'])
+        # carts also hold one of these, so checkouts lock several rows in varying cart order
+        others = [Product.objects.create(category=category, title=f'other {i}', slug=f'{SLUG}-{i}', price=1,
+                                         stock=options['threads'] * options['checkouts'])
+                  for i in range(3)]
+        users = [User.objects.create_user(f'{SLUG}-{i}') for i in range(options['threads'])]
+        errors = []
+        try:
+            with override_settings(ALLOWED_HOSTS=['*']):
+                threads = [
+                    threading.Thread(target=self._worker, args=(user, hot, others, options, seed, errors))
+                    for seed, user in enumerate(users, options['seed'])
+                ]
+                start = time.perf_counter()
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                elapsed = time.perf_counter() - start
+
+            attempts = options['threads'] * options['checkouts']
+            orders = Order.objects.filter(customer__user__in=users)
+            sold = CartProduct.objects.filter(cart__order__in=orders, product=hot).aggregate(
+                qty=models.Sum('qty')
+            )['qty'] or 0
+            hot.refresh_from_db()
+            self.stdout.write(f'{attempts} checkouts in {elapsed:.2f}s ({attempts / elapsed:.0f}/s), '
+                              f'{orders.count()} orders, {len(errors)} errors')
+            self.stdout.write(f'hot product: stock {options["stock"]}, sold {sold}, left {hot.stock}')
+            for error in errors[:5]:
+                self.stderr.write(repr(error))
+            if sold > options['stock'] or hot.stock != options['stock'] - sold:
+                raise CommandError('stock was oversold or lost')
+        finally:
+            OrderEvent.objects.filter(order__customer__user__in=users).delete()
+            Order.objects.filter(customer__user__in=users).delete()
+            Cart.objects.filter(owner__user__in=users).delete()
+            Customer.objects.filter(user__in=users).delete()
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+            category.delete()
+
+    @staticmethod
+    def _worker(user, hot, others, options, seed, errors):
+        rnd = random.Random(seed)
+        client = Client()
+        client.force_login(user)
+        customer = Customer.objects.create(user=user)
+        form = {'first_name': SLUG, 'phone': '0', 'address': SLUG, 'buying_type': Order.BUYING_TYPE_SELF,
+                'order_date': '2030-01-01', 'comment': ''}
+        try:
+            for _ in range(options['checkouts']):
+                try:
+                    cart, _ = Cart.objects.get_or_create(owner=customer, in_order=False,
+                                                         defaults={'final_price': 0, 'number_of_products': 0})
+                    set_cart_quantities(cart, {rnd.choice(others): 1, hot: rnd.randint(1, 3)})
+                    client.post(reverse('make_order'), form)
+                except Exception as exc:
+                    errors.append(exc)
+        finally:
+            connection.close()
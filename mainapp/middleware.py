@@ -0,0 +1,107 @@
+import cProfile
+import os
+import random
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
+
+from mainapp import instrumentation
+from mainapp.cart import resolve_cart
+from mainapp.routers import install_write_flag, routing_state
+
+
+class CartMiddleware(MiddlewareMixin):
+    """
+    Exposes ``request.cart`` and ``request.customer`` lazily, so pages that
+    never look at the cart don't touch the database.
+    Must be placed after SessionMiddleware and AuthenticationMiddleware.
+    MiddlewareMixin makes it usable from async views without forcing the whole stack to sync.
+    """
+
+    def process_request(self, request):
+        request.cart = SimpleLazyObject(lambda: resolve_cart(request)[0])
+        request.customer = SimpleLazyObject(lambda: resolve_cart(request)[1])
+
+
+class PrimaryStickinessMiddleware(MiddlewareMixin):
+    """
+    Pins a visitor's reads to the primary database for ``PRIMARY_STICKY_SECONDS``
+    after a request of theirs wrote, see ``mainapp.routers``.
+    Must be placed after SessionMiddleware.
+    """
+    session_key = '_primary_until'
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        connection_created.connect(install_write_flag, dispatch_uid='primary_stickiness')
+
+    def process_request(self, request):
+        # connections opened before the signal was connected
+        install_write_flag()
+        # a dict, so writes flagged in sync_to_async threads are seen here too
+        request._routing_state = {'pinned': request.session.get(self.session_key, 0) > time.time(), 'wrote': False}
+        routing_state.set(request._routing_state)
+
+    def process_response(self, request, response):
+        state = getattr(request, '_routing_state', None)
+        if state is not None and state['wrote']:
+            request.session[self.session_key] = time.time() + getattr(settings, 'PRIMARY_STICKY_SECONDS', 10)
+        routing_state.set(None)
+        return response
+
+
+class InstrumentationMiddleware:
+    """
+    Records view, queries, duplicated queries, template and wall time of each
+    request into ``mainapp.instrumentation`` and answers with a ``Server-Timing`` header.
+    A share of requests (``INSTRUMENTATION_PROFILE_RATE``) runs under cProfile, kept in
+    ``INSTRUMENTATION_PROFILE_DIR`` when slower than ``INSTRUMENTATION_SLOW_MS``.
+    Place it first to time the whole stack. Sync only: queries run by async views in
+    other threads are not counted.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.profile_rate = getattr(settings, 'INSTRUMENTATION_PROFILE_RATE', 0)
+        self.profile_dir = getattr(settings, 'INSTRUMENTATION_PROFILE_DIR', 'profiles')
+        self.slow_ms = getattr(settings, 'INSTRUMENTATION_SLOW_MS', 500)
+
+    def __call__(self, request):
+        record = instrumentation.RequestRecord(request)
+        token = instrumentation.current_record.set(record)
+        profiler = cProfile.Profile() if random.random() < self.profile_rate else None
+        # execute_wrapper() pops the last wrapper on exit, which may not be ours by then
+        wrapped = [connections[alias] for alias in connections]
+        for connection in wrapped:
+            connection.execute_wrappers.append(record)
+        try:
+            with instrumentation.instrument_templates():
+                if profiler is None:
+                    response = self.get_response(request)
+                else:
+                    response = profiler.runcall(self.get_response, request)
+        finally:
+            for connection in wrapped:
+                if record in connection.execute_wrappers:
+                    connection.execute_wrappers.remove(record)
+            instrumentation.current_record.reset(token)
+        entry = record.finish(response, self._dump(profiler, record))
+        response['Server-Timing'] = instrumentation.server_timing(entry)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = getattr(view_func, 'view_class', view_func)
+        instrumentation.current_record.get().view = f'{view.__module__}.{view.__qualname__}'
+
+    def _dump(self, profiler, record):
+        elapsed_ms = (time.perf_counter() - record.start) * 1000
+        if profiler is None or elapsed_ms < self.slow_ms:
+            return None
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f'{time.strftime("%Y%m%d-%H%M%S")}-{record.view}-{elapsed_ms:.0f}ms.prof')
+        profiler.dump_stats(path)
+        return path
@@ -1,26 +1,32 @@
+import hashlib
+from functools import partial, update_wrapper
+
+from asgiref.sync import sync_to_async
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import classonlymethod
 from django.views.generic import View
 
+from mainapp.caching import NAV_NAMESPACE, cart_namespace, get_category_nav, get_version
+from mainapp.cart import SessionCart, lookup_cart, resolve_cart
+from mainapp.concurrency import gather_sync
 from mainapp.models import *
 
 
-def FindCart(request):
-    cart = None
-    customer = None
-    if request.user.is_authenticated:
-        customer = Customer.objects.filter(user=request.user).first()
-        if not customer:
-            customer = Customer.objects.create(user=request.user)
-        cart = Cart.objects.filter(owner=customer, in_order=False).first()
-        if not cart:
-            cart = Cart.objects.create(owner=customer, final_price=0, number_of_products=0)
+def FindCart(request, found=None):
+    cart, customer = resolve_cart(request, found)
+    if cart is None:
+        cart = SessionCart(request.session)
     return cart, customer
 
 
 class CustomerAndCartMixin(View):
 
     def dispatch(self, request, *args, **kwargs):
-        self.cart, self.customer = FindCart(request)
-        self.categories = Category.objects.all()
+        # AsyncViewMixin may have loaded them already
+        lookups = getattr(self, 'lookups', {})
+        # the concurrent lookup only reads; creating a customer or cart happens here, on the request thread
+        self.cart, self.customer = FindCart(request, lookups.get('cart'))
+        self.categories = lookups['categories'] if 'categories' in lookups else get_category_nav()
         return super().dispatch(request, *args, **kwargs)
 
 
@@ -28,11 +34,68 @@ class CartProductMixin(View):
     def dispatch(self, request, *args, **kwargs):
         self.cart, self.customer = FindCart(request)
         self.slug = kwargs.get('slug')
-        product = Product.objects.get(slug=self.slug)
-        self.cart_product, self.created = CartProduct.objects.get_or_create(
-            owner=self.cart.owner,
-            cart=self.cart,
-            product=product
-        )
-        self.categories = Category.objects.all()
+        self.product = Product.objects.get(slug=self.slug)
+        self.categories = get_category_nav()
         return super().dispatch(request, *args, **kwargs)
+
+    def lock_cart_product(self):
+        """Reads the line item under a row lock, returns None if the product is not in the cart."""
+        cart_product = CartProduct.objects.select_for_update().filter(cart=self.cart, product=self.product).first()
+        if cart_product:
+            # reuse the fetched product so CartProduct.save() doesn't load it again
+            cart_product.product = self.product
+        return cart_product
+
+
+class ConditionalPageMixin:
+    """
+    ETag support for catalog detail pages. The tag is built from the cache
+    versions of what the page shows plus the visitor's cart, so an unchanged
+    page is answered with 304 without fetching rows or rendering the template.
+    """
+
+    def get_etag_parts(self):
+        return [get_version(NAV_NAMESPACE)]
+
+    def get_etag(self):
+        parts = self.get_etag_parts()
+        if isinstance(self.cart, SessionCart):
+            parts += sorted(self.cart.quantities.items())
+        elif self.cart:
+            parts += [self.request.user.pk, self.cart.pk, get_version(cart_namespace(self.cart.pk))]
+        return '"%s"' % hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+        patch_cache_control(response, private=True)
+        return response
+
+
+class AsyncViewMixin:
+    """
+    Serves a CustomerAndCartMixin view from an async handler under ASGI.
+    The lookups from ``get_concurrent_lookups()`` run at the same time and end up
+    in ``self.lookups``; the rest of the view then runs in a single
+    thread-sensitive ``sync_to_async`` call.
+    """
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+        return update_wrapper(async_view, view)
+
+    def get_concurrent_lookups(self):
+        return {'cart': partial(lookup_cart, self.request), 'categories': get_category_nav}
+
+    async def dispatch(self, request, *args, **kwargs):
+        lookups = self.get_concurrent_lookups()
+        self.lookups = dict(zip(lookups, await gather_sync(*lookups.values())))
+        return await sync_to_async(super().dispatch)(request, *args, **kwargs)
@@ -1,16 +1,85 @@
-from PIL import Image
-from io import BytesIO
-from django.core.files.base import ContentFile
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils import timezone
 
+from mainapp.images import rendition_exists, rendition_path
 from mainapp.utils import MAX_IMAGE_SIZE, IMAGE_HEIGHT, IMAGE_WIDTH, validate_image
 
 
-class Category(models.Model):
+def cart_items_prefetch(lookup='products'):
+    return models.Prefetch(lookup, queryset=CartProduct.objects.select_related('product').order_by('id'))
+
+
+def cart_totals_expressions():
+    """Subqueries recomputing Cart.final_price and number_of_products from the line items."""
+    items = CartProduct.objects.filter(cart=models.OuterRef('pk')).order_by().values('cart')
+    price = items.annotate(total=models.Sum('final_price')).values('total')
+    qty = items.annotate(total=models.Sum('qty')).values('total')
+    return {
+        'final_price': Coalesce(models.Subquery(price), models.Value(0), output_field=models.DecimalField()),
+        'number_of_products': Coalesce(models.Subquery(qty), models.Value(0),
+                                       output_field=models.PositiveIntegerField()),
+    }
+
+
+class CartQuerySet(models.QuerySet):
+
+    def with_wrong_totals(self):
+        totals = cart_totals_expressions()
+        return self.annotate(
+            expected_price=totals['final_price'],
+            expected_qty=totals['number_of_products'],
+        ).exclude(
+            final_price=models.F('expected_price'),
+            number_of_products=models.F('expected_qty'),
+        )
+
+
+class OrderQuerySet(models.QuerySet):
+
+    def for_profile(self, customer):
+        # rendered from the snapshot, so no joins back to the cart; served by the (customer, -created_date) index
+        return self.filter(customer=customer).order_by('-created_date')
+
+
+class ImageRenditionsMixin:
+    """Queues new uploads of ``image`` for the image worker and serves its renditions."""
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        uploaded = bool(self.image) and not self.image._committed and (
+            update_fields is None or 'image' in update_fields
+        )
+        if uploaded:
+            self.image_hash = ''
+        super().save(*args, **kwargs)
+        if uploaded:
+            ImageTask.enqueue(self)
+
+    def image_renditions(self, names):
+        """
+        Urls of the given renditions. While any of them is missing the original is
+        served for all; uploads are queued on save, so requests neither render nor write.
+        """
+        if not self.image:
+            return dict.fromkeys(names, '')
+        paths = {}
+        if self.image_hash:
+            paths = {name: rendition_path(self, name, self.image_hash) for name in names}
+        if not paths or not all(rendition_exists(path) for path in paths.values()):
+            return dict.fromkeys(names, self.image.url)
+        return {name: default_storage.url(path) for name, path in paths.items()}
+
+    def image_rendition(self, name):
+        return self.image_renditions([name])[name]
+
+
+class Category(ImageRenditionsMixin, models.Model):
     class Meta:
         verbose_name = "Категория"
         verbose_name_plural = "Категории"
@@ -20,44 +89,29 @@ class Category(models.Model):
                               help_text=f'Maximum image size allowed is {MAX_IMAGE_SIZE}.'
                                         f'Upload images {IMAGE_WIDTH}x{IMAGE_HEIGHT} pixels',
                               upload_to='category/%Y/')
+    image_hash = models.CharField(max_length=40, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
     slug = models.SlugField(unique=True)
 
     def get_absolute_url(self):
         return reverse('category_detail', kwargs={'slug': self.slug})
 
-    def save(self, *args, **kwargs):
-        if self.image:
-            img = Image.open(self.image)
-            resized = img.resize((IMAGE_WIDTH, IMAGE_HEIGHT), Image.ANTIALIAS)
-            new_image_io = BytesIO()
-
-            if img.format == 'JPEG':
-                resized.save(new_image_io, format='JPEG')
-            elif img.format == 'PNG':
-                resized.save(new_image_io, format='PNG')
-
-            temp_name = self.image.name
-            self.image.delete(save=False)
-
-            self.image.save(
-                temp_name,
-                content=ContentFile(new_image_io.getvalue()),
-                save=False
-            )
-
-        super(Category, self).save(*args, **kwargs)
-
     def __str__(self):
         return self.name
 
 
-class Product(models.Model):
+class Product(ImageRenditionsMixin, models.Model):
     class Meta:
         ordering = ["category"]
         verbose_name = 'Продукт'
         verbose_name_plural = 'Продукты'
+        indexes = [
+            models.Index(fields=['category', 'id'], name='product_category_id_idx'),
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+        ]
 
-    category = models.ForeignKey(Category, verbose_name='Категории', on_delete=models.CASCADE)
+    # product_category_id_idx leads with the category, a separate FK index would only slow writes down
+    category = models.ForeignKey(Category, verbose_name='Категории', on_delete=models.CASCADE, db_index=False)
     title = models.CharField(max_length=255, verbose_name='Наименование')
     slug = models.SlugField(unique=True)
     content = models.TextField(verbose_name='Описание', null=True)
@@ -65,7 +119,11 @@ class Product(models.Model):
                               help_text=f'Maximum image size allowed is {MAX_IMAGE_SIZE}.'
                                         f'Upload images {IMAGE_WIDTH}x{IMAGE_HEIGHT} pixels',
                               upload_to='product/%Y/')
+    image_hash = models.CharField(max_length=40, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
     price = models.DecimalField(max_digits=9, decimal_places=2, verbose_name='Цена')
+    stock = models.PositiveIntegerField(null=True, blank=True, verbose_name='Остаток на складе',
+                                        help_text='Пусто - остаток не учитывается')
 
     def __str__(self):
         return f"{self.title}, категория: {self.category.name}"
@@ -79,8 +137,11 @@ class CartProduct(models.Model):
         ordering = ["cart"]
         verbose_name = "Продукт в корзине"
         verbose_name_plural = "Продукты в корзине"
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+        ]
 
-    cart = models.ForeignKey('Cart', verbose_name='Корзина', on_delete=models.CASCADE)
+    cart = models.ForeignKey('Cart', verbose_name='Корзина', related_name='products', on_delete=models.CASCADE)
     qty = models.PositiveIntegerField(default=1)
     final_price = models.DecimalField(max_digits=9, decimal_places=2, verbose_name='Общая цена')
     product = models.ForeignKey(Product, verbose_name='Товар', on_delete=models.CASCADE)
@@ -99,13 +160,17 @@ class Cart(models.Model):
         ordering = ["owner"]
         verbose_name = "Корзина"
         verbose_name_plural = "Все корзины"
+        constraints = [
+            models.UniqueConstraint(fields=['owner'], condition=models.Q(in_order=False), name='unique_open_cart'),
+        ]
 
     owner = models.ForeignKey('Customer', null=True, verbose_name='Владелец', on_delete=models.CASCADE)
-    products = models.ManyToManyField(CartProduct, blank=True, related_name='related_cart')
     number_of_products = models.PositiveIntegerField(default=1)
     final_price = models.DecimalField(max_digits=9, decimal_places=2, verbose_name='Общая цена')
     in_order = models.BooleanField(default=False)
 
+    objects = CartQuerySet.as_manager()
+
     def __str__(self):
         return f"Cart {self.id},owner: {self.owner}"
 
@@ -124,21 +189,22 @@ class Customer(models.Model):
         return f"Покупатель {self.user.first_name, self.user.last_name}"
 
 
-class Order(models.Model):
+class BaseOrder(models.Model):
     class Meta:
-        verbose_name = "Заказ"
-        verbose_name_plural = "Заказы"
+        abstract = True
 
     STATUS_NEW = 'new'
     STATUS_IN_PROGRESS = 'in_progress'
     STATUS_READY = 'is_ready'
     STATUS_COMPLETED = 'is_ready'
+    STATUS_CANCELED = 'canceled'
 
     STATUS_CHOICES = (
         (STATUS_NEW, 'Новый заказ'),
         (STATUS_READY, 'Новый зака'),
         (STATUS_COMPLETED, 'Новый зака'),
         (STATUS_IN_PROGRESS, 'Новый зака'),
+        (STATUS_CANCELED, 'Заказ отменён'),
     )
     BUYING_TYPE_SELF = 'self'
     BUYING_TYPE_DELIVERY = 'delivery'
@@ -146,8 +212,6 @@ class Order(models.Model):
         (BUYING_TYPE_SELF, 'самовывоз'),
         (BUYING_TYPE_DELIVERY, 'доставка'),
     )
-    customer = models.ForeignKey(Customer, verbose_name='Покупатель', related_name='related_orderer',
-                                 on_delete=models.CASCADE)
     first_name = models.CharField(max_length=255, verbose_name='Имя', default='Имя')
     last_name = models.CharField(max_length=255, verbose_name='Фамилия', default='Фамилия')
     address = models.CharField(max_length=255, verbose_name='Адрес', blank=True)
@@ -156,9 +220,118 @@ class Order(models.Model):
     buying_type = models.CharField(max_length=100, verbose_name='Тип заказа', choices=BUYING_CHOICES,
                                    default=BUYING_TYPE_SELF)
     comment = models.TextField(verbose_name='Комментарий к заказу', null=True, blank=True)
-    created_date = models.DateTimeField(auto_now=True, verbose_name='Дата создания заказа')
+    created_date = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания заказа')
     order_date = models.DateField(verbose_name='Дата получения заказа', default=timezone.now)
+    # line items and totals frozen at checkout, see mainapp.history.cart_snapshot
+    snapshot = models.JSONField(default=dict, blank=True, verbose_name='Состав заказа')
+
+    objects = OrderQuerySet.as_manager()
+
+
+class Order(BaseOrder):
+    class Meta:
+        verbose_name = "Заказ"
+        verbose_name_plural = "Заказы"
+        indexes = [
+            models.Index(fields=['customer', '-created_date'], name='order_customer_created_idx'),
+        ]
+
+    customer = models.ForeignKey(Customer, verbose_name='Покупатель', related_name='related_orderer',
+                                 on_delete=models.CASCADE)
     cart = models.ForeignKey(Cart, verbose_name='Корзина', on_delete=models.CASCADE, null=True, blank=True)
 
     def __str__(self):
         return f'{self.id}, {self.cart}'
+
+
+class ArchivedOrder(BaseOrder):
+    """Old finished orders moved out of Order by ``archive_orders``, keeping their ids."""
+
+    class Meta:
+        verbose_name = "Архивный заказ"
+        verbose_name_plural = "Архив заказов"
+        indexes = [
+            models.Index(fields=['customer', '-created_date'], name='archived_customer_created_idx'),
+        ]
+
+    id = models.BigIntegerField(primary_key=True)
+    customer = models.ForeignKey(Customer, verbose_name='Покупатель', related_name='archived_orders',
+                                 on_delete=models.CASCADE)
+    created_date = models.DateTimeField(verbose_name='Дата создания заказа')
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.id}, {self.customer}'
+
+
+class OrderEvent(models.Model):
+    """Outbox row written in the checkout transaction, drained by ``process_order_events``."""
+
+    class Meta:
+        verbose_name = "Событие заказа"
+        verbose_name_plural = "События заказов"
+
+    ORDER_CREATED = 'order_created'
+
+    EVENT_CHOICES = (
+        (ORDER_CREATED, 'Заказ создан'),
+    )
+    # deleting an order keeps its unprocessed events; archive_orders waits for them instead
+    order = models.ForeignKey(Order, verbose_name='Заказ', related_name='events', null=True,
+                              on_delete=models.SET_NULL)
+    event_type = models.CharField(max_length=50, verbose_name='Тип события', choices=EVENT_CHOICES)
+    payload = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    run_after = models.DateTimeField(default=timezone.now, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    @classmethod
+    def record(cls, order, event_type, **payload):
+        return cls.objects.create(order=order, event_type=event_type, payload=payload)
+
+    def __str__(self):
+        return f"{self.event_type} {self.order_id}"
+
+
+class ImageTask(models.Model):
+    class Meta:
+        verbose_name = "Обработка изображения"
+        verbose_name_plural = "Обработка изображений"
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'object_id'], name='unique_image_task'),
+        ]
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    target = GenericForeignKey()
+    run_after = models.DateTimeField(default=timezone.now, db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    @classmethod
+    def enqueue(cls, instance):
+        content_type = ContentType.objects.get_for_model(instance)
+        transaction.on_commit(lambda: cls.objects.update_or_create(
+            content_type=content_type, object_id=instance.pk,
+            defaults={'run_after': timezone.now(), 'attempts': 0, 'last_error': ''},
+        ))
+
+    def __str__(self):
+        return f"{self.content_type} {self.object_id}"
+
+
+class SearchTerm(models.Model):
+    class Meta:
+        verbose_name = "Поисковый термин"
+        verbose_name_plural = "Поисковый индекс"
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'product'], name='unique_search_term'),
+        ]
+
+    term = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, related_name='search_terms', on_delete=models.CASCADE)
+    weight = models.FloatField()
+
+    def __str__(self):
+        return f"{self.term}: {self.product_id}"
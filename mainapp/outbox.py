@@ -0,0 +1,48 @@
+"""
+Handlers for order events recorded in the ``OrderEvent`` outbox.
+
+Checkout only writes the event row; ``python manage.py process_order_events``
+runs the handlers later. A failed event is retried with all of its handlers,
+so handlers have to be idempotent; ``event.order`` is None once the order
+has been deleted. Other apps register theirs from
+``AppConfig.ready()``::
+
+    @outbox.register(OrderEvent.ORDER_CREATED)
+    def send_confirmation(event):
+        ...
+"""
+import logging
+from collections import defaultdict
+
+from mainapp.models import OrderEvent
+
+logger = logging.getLogger(__name__)
+
+_handlers = defaultdict(list)
+
+
+def register(event_type):
+    def decorator(handler):
+        if handler not in _handlers[event_type]:
+            _handlers[event_type].append(handler)
+        return handler
+    return decorator
+
+
+def unregister(event_type, handler):
+    if handler in _handlers[event_type]:
+        _handlers[event_type].remove(handler)
+
+
+def get_handlers(event_type):
+    return list(_handlers[event_type])
+
+
+def dispatch(event):
+    for handler in get_handlers(event.event_type):
+        handler(event)
+
+
+@register(OrderEvent.ORDER_CREATED)
+def log_order_created(event):
+    logger.info('order %s created: %s', event.order_id, event.payload)
@@ -0,0 +1,76 @@
+"""
+Primary/replica routing for ``DATABASE_ROUTERS``.
+
+Catalog and order history reads go to a replica, everything else (carts,
+customers, auth, sessions) and every write go to ``default``. Once a request
+writes, the rest of it and the visitor's following requests for
+``PRIMARY_STICKY_SECONDS`` read from the primary too, so users see their own
+writes despite replication lag. Only requests go to replicas: management
+commands and workers, and reads inside a transaction, always read from the
+primary. The request state is kept by
+``mainapp.middleware.PrimaryStickinessMiddleware``; writes are spotted from
+the SQL run on the primary, since ``db_for_write`` is also asked for plain
+reads such as the lookup half of ``get_or_create``.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = 'default'
+REPLICA_READ_MODELS = ('mainapp.category', 'mainapp.product', 'mainapp.searchterm', 'mainapp.order')
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+# session saves happen on most requests and say nothing about the visitor's data
+UNPINNED_TABLES = ('django_session',)
+
+routing_state = ContextVar('routing_state', default=None)
+
+
+def get_replicas():
+    replicas = getattr(settings, 'DATABASE_REPLICAS', None)
+    if replicas is None:
+        replicas = [alias for alias in settings.DATABASES if alias != PRIMARY]
+    return replicas
+
+
+def flag_writes(execute, sql, params, many, context):
+    state = routing_state.get()
+    if (state is not None and not state['wrote'] and sql.lstrip()[:6].upper() in WRITES
+            and not any(table in sql for table in UNPINNED_TABLES)):
+        state['wrote'] = True
+    return execute(sql, params, many, context)
+
+
+def install_write_flag(sender=None, connection=None, **kwargs):
+    connection = connection or connections[PRIMARY]
+    if connection.alias == PRIMARY and flag_writes not in connection.execute_wrappers:
+        # first, so per-request wrappers that pop the last one on exit can't remove it
+        connection.execute_wrappers.insert(0, flag_writes)
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # related objects come from the same database as the instance
+            return instance._state.db
+        state = routing_state.get()
+        # outside a request (commands, workers) or inside a transaction, reads must see the primary's writes
+        if state is None or state['pinned'] or state['wrote'] or connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        models = getattr(settings, 'REPLICA_READ_MODELS', REPLICA_READ_MODELS)
+        replicas = get_replicas()
+        if model._meta.label_lower in models and replicas:
+            return random.choice(replicas)
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
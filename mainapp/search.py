@@ -0,0 +1,115 @@
+"""
+Product search over ``title`` and ``content``.
+
+The default backend keeps an inverted index in the ``SearchTerm`` table,
+maintained on every product save, so it runs on SQLite as well as on
+PostgreSQL. Set ``SEARCH_BACKEND = 'postgres'`` to rank with ``SearchVector``
+instead (add a GIN index on the same vector expression for large catalogs).
+"""
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import models, transaction
+
+from mainapp.models import Product, SearchTerm
+
+TOKEN_RE = re.compile(r'\w+')
+MIN_TOKEN_LENGTH = 2
+MAX_TOKEN_LENGTH = 64
+MAX_QUERY_TOKENS = 8
+TITLE_WEIGHT = 3
+CONTENT_WEIGHT = 1
+
+
+def tokenize(text):
+    return [
+        token[:MAX_TOKEN_LENGTH] for token in TOKEN_RE.findall((text or '').lower())
+        if len(token) >= MIN_TOKEN_LENGTH
+    ]
+
+
+def product_terms(product):
+    weights = Counter()
+    for token in tokenize(product.title):
+        weights[token] += TITLE_WEIGHT
+    for token in tokenize(product.content):
+        weights[token] += CONTENT_WEIGHT
+    return [SearchTerm(term=term, product_id=product.pk, weight=weight) for term, weight in weights.items()]
+
+
+def index_products(products):
+    """Replaces the index entries of ``products`` in one delete and one bulk insert."""
+    products = list(products)
+    with transaction.atomic():
+        SearchTerm.objects.filter(product__in=[product.pk for product in products]).delete()
+        SearchTerm.objects.bulk_create(
+            [term for product in products for term in product_terms(product)], batch_size=1000
+        )
+
+
+class InvertedIndexBackend:
+
+    def search(self, query, limit, prefix=True):
+        tokens = tokenize(query)[:MAX_QUERY_TOKENS]
+        if not tokens:
+            return []
+        # every query token must match; the last one matches as a prefix for autocomplete
+        matched = []
+        for index, token in enumerate(tokens):
+            if prefix and index == len(tokens) - 1:
+                lookup = models.Q(term__gte=token, term__lt=token + '\U0010ffff')
+            else:
+                lookup = models.Q(term=token)
+            matched.append((lookup, index))
+        terms = models.Q()
+        for lookup, _ in matched:
+            terms |= lookup
+        # a match has every token, so only the products of the rarest one are aggregated;
+        # counting postings is an index range scan per token
+        counts = SearchTerm.objects.filter(terms).aggregate(**{
+            f'token_{index}': models.Count('pk', filter=lookup) for lookup, index in matched
+        })
+        rarest, index = min(matched, key=lambda match: counts[f'token_{match[1]}'])
+        if not counts[f'token_{index}']:
+            return []
+        token_index = models.Case(
+            *[models.When(lookup, then=models.Value(index)) for lookup, index in matched],
+            output_field=models.IntegerField(),
+        )
+        candidates = SearchTerm.objects.filter(rarest).values('product_id')
+        ranked = SearchTerm.objects.filter(terms, product_id__in=candidates).values('product_id').annotate(
+            rank=models.Sum('weight'),
+            hits=models.Count(token_index, distinct=True),
+        ).filter(hits=len(tokens)).order_by('-rank', 'product_id')
+        return [row['product_id'] for row in ranked[:limit]]
+
+
+class PostgresBackend:
+
+    def search(self, query, limit, prefix=True):
+        from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+
+        tokens = tokenize(query)[:MAX_QUERY_TOKENS]
+        if not tokens:
+            return []
+        if prefix:
+            tokens[-1] += ':*'
+        search_query = SearchQuery(' & '.join(tokens), search_type='raw', config='simple')
+        vector = (SearchVector('title', weight='A', config='simple')
+                  + SearchVector('content', weight='B', config='simple'))
+        ranked = Product.objects.annotate(search=vector).filter(search=search_query).annotate(
+            rank=SearchRank(vector, search_query)
+        ).order_by('-rank', 'id')
+        return list(ranked.values_list('id', flat=True)[:limit])
+
+
+def get_search_backend():
+    if getattr(settings, 'SEARCH_BACKEND', 'index') == 'postgres':
+        return PostgresBackend()
+    return InvertedIndexBackend()
+
+
+def search_products(query, limit=20, prefix=True):
+    """Ids of the best matching products, best first."""
+    return get_search_backend().search(query, limit, prefix)
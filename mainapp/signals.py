@@ -0,0 +1,48 @@
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from mainapp.caching import NAV_NAMESPACE, PRODUCTS_NAMESPACE, bump_version, category_namespace, product_namespace
+from mainapp.cart import invalidate_cart
+from mainapp.models import Category, Product
+from mainapp.search import index_products
+
+
+@receiver(user_logged_out)
+def forget_cart_on_logout(sender, request, user, **kwargs):
+    if request is not None:
+        invalidate_cart(request)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category(sender, instance, **kwargs):
+    bump_version(NAV_NAMESPACE)
+    bump_version(category_namespace(instance.pk))
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_location(sender, instance, **kwargs):
+    if instance.pk:
+        instance._old_location = Product.objects.filter(pk=instance.pk).values_list('category_id', 'slug').first()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product(sender, instance, **kwargs):
+    bump_version(PRODUCTS_NAMESPACE)
+    bump_version(product_namespace(instance.slug))
+    bump_version(category_namespace(instance.category_id))
+    old_location = getattr(instance, '_old_location', None)
+    if old_location:
+        old_category_id, old_slug = old_location
+        if old_category_id != instance.category_id:
+            bump_version(category_namespace(old_category_id))
+        if old_slug != instance.slug:
+            bump_version(product_namespace(old_slug))
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'title', 'content'} & set(update_fields):
+        index_products([instance])
@@ -0,0 +1,80 @@
+"""
+Stock on hand for products with a tracked ``Product.stock`` (``None`` means unlimited).
+
+Checkout reserves the whole cart at once: every product row is locked with a
+single ``select_for_update`` ordered by pk, so concurrent checkouts always take
+the locks in the same order and can't deadlock. The cart's lines are locked
+first and read under that lock. Cart views only compare against
+the product row they already loaded, without locking. Stock changes skip the
+model signals, so they move ``updated_at`` and bump the catalog caches themselves.
+"""
+from django.db import models, transaction
+from django.utils import timezone
+
+from mainapp.caching import PRODUCTS_NAMESPACE, bump_versions, category_namespace, product_namespace
+from mainapp.models import CartProduct, Order, Product
+
+
+class InsufficientStock(Exception):
+
+    def __init__(self, products):
+        self.products = products
+        super().__init__(', '.join(product.title for product in products))
+
+
+def in_stock(product, qty):
+    return product.stock is None or product.stock >= qty
+
+
+def invalidate_stock(products):
+    """Bumps the caches showing ``products`` once the transaction commits; takes (slug, category_id) pairs."""
+    namespaces = {PRODUCTS_NAMESPACE}
+    for slug, category_id in products:
+        namespaces.update((product_namespace(slug), category_namespace(category_id)))
+    transaction.on_commit(lambda: bump_versions(namespaces))
+
+
+def reserve_stock(cart):
+    """Takes the cart's quantities off the stock, or raises InsufficientStock without taking anything."""
+    with transaction.atomic():
+        # the lines stay locked until the order is placed, so their quantities can't change under the reservation
+        quantities = dict(CartProduct.objects.select_for_update().filter(cart=cart).values_list('product_id', 'qty'))
+        products = list(
+            Product.objects.select_for_update().filter(pk__in=quantities, stock__isnull=False).order_by('pk')
+        )
+        short = [product for product in products if product.stock < quantities[product.pk]]
+        if short:
+            raise InsufficientStock(short)
+        now = timezone.now()
+        for product in products:
+            product.stock -= quantities[product.pk]
+            product.updated_at = now
+        Product.objects.bulk_update(products, ['stock', 'updated_at'])
+        invalidate_stock((product.slug, product.category_id) for product in products)
+
+
+def release_stock(cart):
+    """Puts the cart's quantities back, e.g. when its order is cancelled."""
+    quantities = CartProduct.objects.filter(cart=cart, product__stock__isnull=False).order_by(
+        'product_id'
+    ).values_list('product_id', 'qty', 'product__slug', 'product__category_id')
+    now = timezone.now()
+    with transaction.atomic():
+        # pk order, the same as reserve_stock
+        for product_id, qty, _, _ in quantities:
+            Product.objects.filter(pk=product_id, stock__isnull=False).update(
+                stock=models.F('stock') + qty, updated_at=now
+            )
+        invalidate_stock((slug, category_id) for _, _, slug, category_id in quantities)
+
+
+def cancel_order(order):
+    """Cancels the order and releases its stock; returns False if it was already cancelled."""
+    with transaction.atomic():
+        cancelled = Order.objects.filter(pk=order.pk).exclude(status=Order.STATUS_CANCELED).update(
+            status=Order.STATUS_CANCELED
+        )
+        if cancelled and order.cart_id:
+            release_stock(order.cart_id)
+    order.status = Order.STATUS_CANCELED
+    return bool(cancelled)
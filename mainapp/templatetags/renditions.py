@@ -0,0 +1,30 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from mainapp.images import RENDITIONS, SRCSET_RENDITIONS
+
+register = template.Library()
+
+
+@register.simple_tag
+def rendition_img(instance, name='listing', sizes=None, **attrs):
+    """
+    Renders ``<img>`` for the ``name`` rendition of ``instance.image`` with a
+    srcset of all sizes and a WebP ``<source>``, e.g.
+    ``{% rendition_img product 'thumb' sizes='200px' width=200 %}``.
+    """
+    if not instance.image:
+        return ''
+    urls = instance.image_renditions(SRCSET_RENDITIONS + ('webp',))
+    if len(set(urls.values())) == 1:
+        # renditions aren't ready yet, serve the original
+        return format_html('<img src="{}"{}>', urls[name], flatatt(attrs))
+    srcset = ', '.join(f'{urls[size]} {RENDITIONS[size][0]}w' for size in SRCSET_RENDITIONS)
+    if sizes:
+        attrs['sizes'] = sizes
+    return format_html(
+        '<picture><source type="image/webp" srcset="{} {}w"{}><img src="{}" srcset="{}"{}></picture>',
+        urls['webp'], RENDITIONS['webp'][0], flatatt({'sizes': sizes} if sizes else {}),
+        urls[name], srcset, flatatt(attrs),
+    )
@@ -1,3 +1,335 @@
-from django.test import TestCase
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from mainapp.caching import get_cache
+from mainapp.cart import ANONYMOUS_CART_SESSION_KEY, set_cart_quantities
+from mainapp.history import cart_snapshot
+from mainapp.middleware import PrimaryStickinessMiddleware
+from mainapp.models import *
+from mainapp.routers import PRIMARY, PrimaryReplicaRouter, flag_writes, routing_state
+from mainapp.search import index_products, search_products
+
+
+class ShopTestCase(TestCase):
+    """A category of products and a logged-in customer with an open cart."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Лампы', slug='lamps')
+        cls.products = [
+            Product.objects.create(category=cls.category, title=f'Лампа {i}', slug=f'lamp-{i}', content='Лампа',
+                                   price=100 + i)
+            for i in range(6)
+        ]
+        cls.user = User.objects.create_user('buyer', password='password')
+        cls.customer = Customer.objects.create(user=cls.user, phone='0', address='Москва')
+        cls.cart = Cart.objects.create(owner=cls.customer, final_price=0, number_of_products=0)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get(self, path, **extra):
+        # cold catalog caches, so the count doesn't depend on which test ran first
+        get_cache().clear()
+        response = self.client.get(path, **extra)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def count_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            self.get(path)
+        return len(queries)
+
+    def assertConstantQueries(self, path, grow):
+        """Requests ``path``, calls ``grow()`` to add rows the page shows, and expects the same query count."""
+        # the first request of a session stores the cart id in it
+        self.get(path)
+        expected = self.count_queries(path)
+        grow()
+        with self.assertNumQueries(expected):
+            self.get(path)
+
+    def place_order(self, products):
+        cart = Cart.objects.create(owner=self.customer, final_price=0, number_of_products=0, in_order=True)
+        set_cart_quantities(cart, {product: 1 for product in products})
+        return Order.objects.create(customer=self.customer, cart=cart, phone='0', snapshot=cart_snapshot(cart))
+
+
+class PageQueryCountTests(ShopTestCase):
+
+    def test_cart_page(self):
+        set_cart_quantities(self.cart, {self.products[0]: 1})
+        self.assertConstantQueries('/cart/', lambda: set_cart_quantities(
+            self.cart, {product: 2 for product in self.products}
+        ))
+
+    def test_checkout_page(self):
+        set_cart_quantities(self.cart, {self.products[0]: 1})
+        self.assertConstantQueries('/checkout/', lambda: set_cart_quantities(
+            self.cart, {product: 2 for product in self.products}
+        ))
+
+    def test_profile_page(self):
+        self.place_order(self.products[:1])
+
+        def grow():
+            for count in range(2, 6):
+                self.place_order(self.products[:count])
+        self.assertConstantQueries('/profile/', grow)
+
+    def test_category_page(self):
+        category = Category.objects.create(name='Столы', slug='tables')
+        Product.objects.create(category=category, title='Стол', slug='table-0', price=1000)
+        # images still waiting for their renditions, served as uploaded
+        self.assertConstantQueries('/category/tables/', lambda: [
+            Product.objects.create(category=category, title='Стол', slug=f'table-{i}', price=1000,
+                                   image=f'product/table-{i}.jpg')
+            for i in range(1, 6)
+        ])
+
+    def test_home_page(self):
+        self.assertConstantQueries('/', lambda: [
+            Category.objects.create(name=f'Категория {i}', slug=f'category-{i}') for i in range(3)
+        ])
+
+
+class ConditionalPageTests(ShopTestCase):
+
+    def assertNotModified(self, path):
+        etag = self.client.get(path)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # only the session, user and cart lookups
+        self.assertFalse([query['sql'] for query in queries if 'mainapp_product' in query['sql']])
+        return etag
+
+    def test_product_page_not_modified(self):
+        etag = self.assertNotModified('/products/lamp-0/')
+        self.products[0].save()
+        self.assertEqual(self.client.get('/products/lamp-0/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_category_page_not_modified(self):
+        etag = self.assertNotModified('/category/lamps/')
+        self.products[1].delete()
+        self.assertEqual(self.client.get('/category/lamps/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_no_etag_on_failed_precondition(self):
+        response = self.client.get('/products/lamp-0/', HTTP_IF_MATCH='"other"')
+        self.assertEqual(response.status_code, 412)
+        self.assertNotIn('ETag', response)
+
+    def test_cart_change_invalidates(self):
+        etag = self.assertNotModified('/products/lamp-0/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get('/add-to-cart/lamp-0/')
+        self.assertEqual(self.client.get('/products/lamp-0/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class SessionCartTests(ShopTestCase):
+
+    def setUp(self):
+        self.client.logout()
+
+    def login(self):
+        response = self.client.post('/login/', {'username': 'buyer', 'password': 'password'})
+        self.assertEqual(response.status_code, 302)
+
+    def cart_quantities(self):
+        return dict(CartProduct.objects.filter(cart=self.cart).values_list('product__slug', 'qty'))
+
+    def test_anonymous_cart_writes_no_rows(self):
+        counts = Customer.objects.count(), Cart.objects.count()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/add-to-cart/lamp-0/')
+            self.client.post('/change-qty-in-cart/lamp-0/', {'qty': 3})
+            self.client.get('/add-to-cart/lamp-1/')
+            response = self.client.get('/cart/')
+        self.assertEqual((Customer.objects.count(), Cart.objects.count()), counts)
+        writes = [query['sql'] for query in queries if 'mainapp_' in query['sql']
+                  and query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+        self.assertEqual(writes, [])
+        self.assertEqual(response.context['cart'].number_of_products, 4)
+
+    def test_merge_keeps_larger_quantity(self):
+        set_cart_quantities(self.cart, {self.products[0]: 5, self.products[1]: 1, self.products[2]: 2})
+        self.client.get('/add-to-cart/lamp-0/')
+        self.client.get('/add-to-cart/lamp-1/')
+        self.client.post('/change-qty-in-cart/lamp-1/', {'qty': 4})
+        self.client.get('/add-to-cart/lamp-3/')
+        self.login()
+        self.assertEqual(self.cart_quantities(), {'lamp-0': 5, 'lamp-1': 4, 'lamp-2': 2, 'lamp-3': 1})
+        self.cart.refresh_from_db()
+        items = CartProduct.objects.filter(cart=self.cart)
+        self.assertEqual(self.cart.number_of_products, sum(item.qty for item in items))
+        self.assertEqual(self.cart.final_price, sum(item.final_price for item in items))
+
+    def test_merge_into_new_customer_cart(self):
+        Cart.objects.filter(pk=self.cart.pk).delete()
+        self.client.get('/add-to-cart/lamp-0/')
+        self.login()
+        cart = Cart.objects.get(owner=self.customer, in_order=False)
+        self.assertEqual(list(cart.products.values_list('product__slug', 'qty')), [('lamp-0', 1)])
+
+    def test_merge_caps_at_stock(self):
+        Product.objects.filter(slug='lamp-0').update(stock=2)
+        self.client.get('/add-to-cart/lamp-0/')
+        session = self.client.session
+        session[ANONYMOUS_CART_SESSION_KEY] = {str(self.products[0].pk): 5}
+        session.save()
+        self.login()
+        self.assertEqual(self.cart_quantities(), {'lamp-0': 2})
+
+    def test_merge_skips_deleted_products(self):
+        self.client.get('/add-to-cart/lamp-0/')
+        self.client.get('/add-to-cart/lamp-1/')
+        Product.objects.filter(slug='lamp-1').delete()
+        self.login()
+        self.assertEqual(self.cart_quantities(), {'lamp-0': 1})
+
+    def test_session_cart_is_emptied_after_merge(self):
+        self.client.get('/add-to-cart/lamp-0/')
+        self.login()
+        self.assertNotIn(ANONYMOUS_CART_SESSION_KEY, self.client.session)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class RouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.state = {'pinned': False, 'wrote': False}
+        token = routing_state.set(self.state)
+        self.addCleanup(routing_state.reset, token)
+
+    def test_request_reads_catalog_from_replica(self):
+        for model in (Category, Product, Order):
+            self.assertEqual(self.router.db_for_read(model), 'replica')
+        for model in (Cart, CartProduct, Customer, User):
+            self.assertEqual(self.router.db_for_read(model), PRIMARY)
+
+    def test_reads_outside_requests_use_primary(self):
+        routing_state.set(None)
+        self.assertEqual(self.router.db_for_read(Product), PRIMARY)
+
+    def test_reads_after_a_write_use_primary(self):
+        self.state['wrote'] = True
+        self.assertEqual(self.router.db_for_read(Product), PRIMARY)
+
+    def test_pinned_visitor_reads_from_primary(self):
+        self.state['pinned'] = True
+        self.assertEqual(self.router.db_for_read(Product), PRIMARY)
+
+    def test_reads_in_transaction_use_primary(self):
+        with mock.patch.object(connections[PRIMARY], 'in_atomic_block', True):
+            self.assertEqual(self.router.db_for_read(Product), PRIMARY)
+
+    def test_related_reads_follow_instance(self):
+        product = Product(pk=1)
+        product._state.db = PRIMARY
+        self.assertEqual(self.router.db_for_read(Category, instance=product), PRIMARY)
+
+    def test_writes_use_primary(self):
+        self.assertEqual(self.router.db_for_write(Product), PRIMARY)
+
+    def test_write_flag(self):
+        execute = mock.Mock()
+        flag_writes(execute, 'SELECT * FROM "mainapp_product"', (), False, {})
+        flag_writes(execute, 'UPDATE "django_session" SET "session_data" = %s', (), False, {})
+        self.assertFalse(self.state['wrote'])
+        flag_writes(execute, 'INSERT INTO "mainapp_cartproduct" ("qty") VALUES (%s)', (), False, {})
+        self.assertTrue(self.state['wrote'])
+        self.assertEqual(execute.call_count, 3)
+
+
+class CheckoutTests(ShopTestCase):
+    form = {'first_name': 'Покупатель', 'phone': '0', 'address': 'Москва', 'buying_type': Order.BUYING_TYPE_SELF,
+            'order_date': '2030-01-01', 'comment': ''}
+
+    def test_cart_is_ordered_once(self):
+        # loaded before the cart filled up, like a request racing another one
+        stale = Cart.objects.get(pk=self.cart.pk)
+        Product.objects.filter(pk=self.products[0].pk).update(stock=5)
+        set_cart_quantities(self.cart, {self.products[0]: 2, self.products[1]: 1})
+        with mock.patch('mainapp.mixins.FindCart', return_value=(stale, self.customer)):
+            for _ in range(2):
+                self.assertEqual(self.client.post('/make-order/', self.form).status_code, 302)
+        order = Order.objects.get(customer=self.customer)
+        cart = Cart.objects.get(pk=self.cart.pk)
+        self.assertTrue(cart.in_order)
+        self.assertEqual((cart.number_of_products, cart.final_price), (3, 2 * 100 + 101))
+        self.assertEqual((order.snapshot['qty'], order.snapshot['total']), (3, str(cart.final_price)))
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).stock, 3)
+
+
+class SearchTests(ShopTestCase):
+
+    def test_rare_word_next_to_a_common_one(self):
+        Product.objects.bulk_create([
+            Product(category=self.category, title=f'Красная лампа {i}', slug=f'red-lamp-{i}', price=100)
+            for i in range(1100)
+        ])
+        index_products(Product.objects.all())
+        shirt = Product.objects.create(category=self.category, title='Рубашка', slug='shirt', content='красная',
+                                       price=100)
+        self.assertEqual(search_products('красная рубашка'), [shirt.pk])
+        self.assertEqual(search_products('красная руб'), [shirt.pk])
+        self.assertEqual(len(search_products('красная лампа', limit=2000)), 1100)
+        self.assertEqual(search_products('красная кофта'), [])
+
+
+class MiddlewareWrapperTests(ShopTestCase):
+    instrumentation = 'mainapp.middleware.InstrumentationMiddleware'
+    stickiness = 'mainapp.middleware.PrimaryStickinessMiddleware'
+
+    def test_execute_wrappers_do_not_grow(self):
+        self.addCleanup(setattr, connection, 'execute_wrappers', list(connection.execute_wrappers))
+        middleware = [name for name in settings.MIDDLEWARE if name not in (self.instrumentation, self.stickiness)]
+        session = middleware.index('django.contrib.sessions.middleware.SessionMiddleware') + 1
+        with override_settings(MIDDLEWARE=[self.instrumentation, *middleware[:session], self.stickiness,
+                                           *middleware[session:]]):
+            self.get('/')
+            wrappers = list(connection.execute_wrappers)
+            for _ in range(5):
+                self.get('/')
+                self.client.get('/add-to-cart/lamp-0/')
+            self.assertEqual(connection.execute_wrappers, wrappers)
+            self.assertIs(wrappers[0], flag_writes)
+            # the write flag survived the instrumentation wrappers
+            self.assertIn(PrimaryStickinessMiddleware.session_key, self.client.session)
+
+
+class PageRoutingTests(TransactionTestCase):
+    """Requests pages through the router with an in-memory SQLite database standing in for the replica."""
+    replica = 'routing_replica'
+    stickiness = 'mainapp.middleware.PrimaryStickinessMiddleware'
+
+    def setUp(self):
+        middleware = [name for name in settings.MIDDLEWARE if name != self.stickiness]
+        session = middleware.index('django.contrib.sessions.middleware.SessionMiddleware') + 1
+        routed = override_settings(
+            DATABASE_ROUTERS=['mainapp.routers.PrimaryReplicaRouter'],
+            DATABASE_REPLICAS=[self.replica],
+            MIDDLEWARE=[*middleware[:session], self.stickiness, *middleware[session:]],
+        )
+        routed.enable()
+        self.addCleanup(routed.disable)
+        connections.settings[self.replica] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+        self.addCleanup(self.drop_replica)
+        call_command('migrate', database=self.replica, run_syncdb=True, verbosity=0)
+
+    def drop_replica(self):
+        connections[self.replica].close()
+        del connections[self.replica]
+        del connections.settings[self.replica]
+
+    def test_pages_are_routed(self):
+        # catalog pages read from the replica, a visitor who wrote reads from the primary until the window is over
+        call_command('check_db_routing', stdout=StringIO())
@@ -1,6 +1,6 @@
 from django.core.exceptions import ValidationError
 from django.core.files.images import get_image_dimensions
-from django.db import models
+from django.db import models, transaction
 
 MAX_IMAGE_SIZE = 2
 IMAGE_WIDTH = 600
@@ -13,14 +13,18 @@ def validate_image(obj):
         raise ValidationError(f"Max file size is {MAX_IMAGE_SIZE} MB")
 
 
-def calc_cart(cart):
-    cart_data = cart.products.aggregate(models.Sum('final_price'), models.Sum('qty'))
-    if cart_data.get('final_price__sum'):
-        cart.final_price = cart_data['final_price__sum']
-    else:
-        cart.final_price = 0
-    if cart_data['qty__sum']:
-        cart.number_of_products = cart_data['qty__sum']
-    else:
-        cart.number_of_products = 0
-    cart.save()
+def apply_cart_delta(cart, qty_delta, price_delta):
+    """Shifts the stored cart totals by a line item change in a single UPDATE."""
+    # imported here because mainapp.caching depends on the models, which import this module
+    from mainapp.caching import bump_version, cart_namespace
+    # after commit, so nobody re-caches the old items under the new version
+    transaction.on_commit(lambda: bump_version(cart_namespace(cart.pk)))
+    if not qty_delta and not price_delta:
+        return
+    type(cart).objects.filter(pk=cart.pk).update(
+        number_of_products=models.F('number_of_products') + qty_delta,
+        final_price=models.F('final_price') + price_delta,
+    )
+    cart.number_of_products += qty_delta
+    cart.final_price += price_delta
+
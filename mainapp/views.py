@@ -1,52 +1,88 @@
+from functools import partial
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
 from django.contrib.auth import authenticate, login
+from django.core.paginator import Paginator
 from django.db import transaction
 from django.shortcuts import render
+from django.utils.decorators import method_decorator
 from django.views.generic import DetailView, ListView
-from django.http import HttpResponseRedirect
+from django.http import Http404, HttpResponseRedirect, JsonResponse
+from mainapp import instrumentation
+from mainapp.caching import (
+    category_namespace, get_cart_items, get_category, get_category_products, get_product, get_version,
+    product_namespace
+)
+from mainapp.cart import MAX_CART_QTY, invalidate_cart, merge_session_cart
 from mainapp.forms import OrderForm, LoginForm, RegistrationForm
+from mainapp.history import cart_snapshot
 from mainapp.mixins import *
-from mainapp.utils import calc_cart
+from mainapp.stock import InsufficientStock, in_stock, reserve_stock
+from mainapp.utils import apply_cart_delta
 
 
 class BaseView(CustomerAndCartMixin, ListView):
     paginate_by = 4
-    queryset = Category.objects.all()
     template_name = 'mainapp/layout.html'
     context_object_name = 'categories'
 
+    def get_queryset(self):
+        return self.categories
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['cart'] = self.cart
         return context
 
 
-class ProductDetailView(CustomerAndCartMixin, DetailView):
+class ProductDetailView(CustomerAndCartMixin, ConditionalPageMixin, DetailView):
     slug_url_kwarg = 'slug'
     model = Product
     context_object_name = 'product'
     template_name = 'mainapp/product_detail.html'
-    queryset = Product.objects.all()
+
+    def get_etag_parts(self):
+        return super().get_etag_parts() + [get_version(product_namespace(self.kwargs['slug']))]
+
+    def get_object(self, queryset=None):
+        product = get_product(self.kwargs['slug'])
+        if product is None:
+            raise Http404
+        return product
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['cart'] = self.cart
         context['categories'] = self.categories
-        product_slug = self.kwargs['slug']
-        product = Product.objects.get(slug=product_slug)
-        cart_product = CartProduct.objects.filter(cart=self.cart, product=product).first()
-        context['product_in_cart'] = True if cart_product else False
+        context['product_version'] = get_version(product_namespace(self.object.slug))
+        context['product_in_cart'] = any(
+            item.product_id == self.object.id for item in get_cart_items(self.cart)
+        )
         return context
 
 
-class CategoryDetailView(CustomerAndCartMixin, DetailView):
+class CategoryDetailView(CustomerAndCartMixin, ConditionalPageMixin, DetailView):
     slug_url_kwarg = 'slug'
     template_name = 'mainapp/category_detail.html'
     model = Category
     context_object_name = 'category'
 
+    def get_etag_parts(self):
+        # the category itself is covered by the nav version
+        category = get_category(self.kwargs['slug'])
+        products_version = get_version(category_namespace(category.pk)) if category else None
+        return super().get_etag_parts() + [self.kwargs['slug'], products_version]
+
+    def get_object(self, queryset=None):
+        category = get_category(self.kwargs['slug'])
+        if category is None:
+            raise Http404
+        return category
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['products'] = Product.objects.filter(category=Category.objects.get(slug=self.kwargs['slug']))
+        context['products'] = get_category_products(self.object)
         context['cart'] = self.cart
         context['categories'] = self.categories
         return context
@@ -58,6 +94,7 @@ class CartView(CustomerAndCartMixin, View):
         data = {
             'customer': self.customer,
             'cart': self.cart,
+            'items': get_cart_items(self.cart),
             'categories': self.categories,
         }
         return render(request, 'mainapp/cart.html', data)
@@ -66,20 +103,36 @@ class CartView(CustomerAndCartMixin, View):
 class AddToCartView(CartProductMixin, View):
 
     def get(self, request, *args, **kwargs):
+        if in_stock(self.product, 1):
+            self.add_to_cart()
         slug = kwargs.get('slug')
-        if self.created:
-            self.cart.products.add(self.cart_product)
-            calc_cart(self.cart)
-
         return HttpResponseRedirect(reverse('products_detail', args=(slug,)))
 
+    def add_to_cart(self):
+        if isinstance(self.cart, SessionCart):
+            self.cart.add(self.product)
+            return
+        with transaction.atomic():
+            cart_product, created = CartProduct.objects.get_or_create(
+                cart=self.cart,
+                product=self.product,
+                defaults={'owner': self.cart.owner}
+            )
+            if created:
+                apply_cart_delta(self.cart, cart_product.qty, cart_product.final_price)
+
 
 class DeleteFromCartView(CartProductMixin, View):
 
+    @transaction.atomic
     def get(self, request, *args, **kwargs):
-        self.cart.products.remove(self.cart_product)
-        self.cart_product.delete()
-        calc_cart(self.cart)
+        if isinstance(self.cart, SessionCart):
+            self.cart.remove(self.product)
+        else:
+            cart_product = self.lock_cart_product()
+            if cart_product:
+                cart_product.delete()
+                apply_cart_delta(self.cart, -cart_product.qty, -cart_product.final_price)
         if '/cart/' in request.META.get('HTTP_REFERER'):
             return HttpResponseRedirect('/cart/')
         else:
@@ -88,22 +141,37 @@ class DeleteFromCartView(CartProductMixin, View):
 
 class ChangeQtyView(CartProductMixin, View):
 
+    @transaction.atomic
     def post(self, request, *args, **kwargs):
-        qty = request.POST.get('qty')
-        self.cart_product.qty = int(qty)
-        self.cart_product.save()
-        calc_cart(self.cart)
+        qty = min(int(request.POST.get('qty')), MAX_CART_QTY)
+        if not in_stock(self.product, qty):
+            qty = self.product.stock
+        if isinstance(self.cart, SessionCart):
+            self.cart.set_qty(self.product, qty)
+            return HttpResponseRedirect('/cart/')
+        cart_product = self.lock_cart_product()
+        if cart_product and qty <= 0:
+            # sold out: drop the line instead of keeping it with qty 0
+            cart_product.delete()
+            apply_cart_delta(self.cart, -cart_product.qty, -cart_product.final_price)
+        elif cart_product:
+            old_qty, old_price = cart_product.qty, cart_product.final_price
+            cart_product.qty = qty
+            cart_product.save(update_fields=['qty', 'final_price'])
+            apply_cart_delta(self.cart, cart_product.qty - old_qty, cart_product.final_price - old_price)
         return HttpResponseRedirect('/cart/')
 
 
 class CheckoutView(CustomerAndCartMixin, View):
 
     def get(self, request, *args, **kwargs):
-        customer = Customer.objects.get(user=request.user)
+        if not request.user.is_authenticated:
+            return HttpResponseRedirect('/login/')
         form = OrderForm(request.POST or None)
         data = {
-            'customer': customer,
+            'customer': self.customer,
             'cart': self.cart,
+            'items': get_cart_items(self.cart),
             'form': form,
         }
         return render(request, 'mainapp/checkout.html', data)
@@ -113,21 +181,42 @@ class MakeOrderView(CustomerAndCartMixin, View):
 
     @transaction.atomic
     def post(self, request, *args, **kwargs):
-        customer = Customer.objects.get(user=request.user)
+        if not request.user.is_authenticated:
+            return HttpResponseRedirect('/login/')
         form = OrderForm(request.POST)
         if form.is_valid():
-            self.cart.in_order = True
-            self.cart.save()
+            # locked and re-read, so a concurrent checkout of the same cart finds it ordered
+            cart = Cart.objects.select_for_update().filter(pk=self.cart.pk, in_order=False).first()
+            if cart is None:
+                return HttpResponseRedirect('/')
+            try:
+                reserve_stock(cart)
+            except InsufficientStock as exc:
+                form.add_error(None, f'Недостаточно товара на складе: {exc}')
+                data = {
+                    'customer': self.customer,
+                    'cart': cart,
+                    'items': get_cart_items(cart),
+                    'form': form,
+                }
+                return render(request, 'mainapp/checkout.html', data)
+            cart.in_order = True
+            cart.save(update_fields=['in_order'])
             new_order = form.save(commit=False)
-            new_order.customer = customer
+            new_order.customer = self.customer
             new_order.first_name = form.cleaned_data['first_name']
             new_order.address = form.cleaned_data['address']
             new_order.phone = form.cleaned_data['phone']
             new_order.buying_type = form.cleaned_data['buying_type']
             new_order.comment = form.cleaned_data['comment']
             new_order.order_date = form.cleaned_data['order_date']
-            new_order.cart = self.cart
+            new_order.cart = cart
+            new_order.snapshot = cart_snapshot(cart)
             new_order.save()
+            # side effects run in process_order_events, outside the checkout request
+            OrderEvent.record(new_order, OrderEvent.ORDER_CREATED, cart=cart.pk,
+                              final_price=str(cart.final_price))
+            invalidate_cart(request)
 
             return HttpResponseRedirect('/')
         return HttpResponseRedirect('/checkout/')
@@ -152,6 +241,7 @@ class LoginView(CustomerAndCartMixin, View):
             user = authenticate(username=username, password=password)
             if user:
                 login(request, user)
+                merge_session_cart(request)
                 return HttpResponseRedirect('/')
         data = {
             'customer': self.customer,
@@ -191,6 +281,7 @@ class RegistrationView(CustomerAndCartMixin, View):
             )
             user = authenticate(username=form.cleaned_data['username'], password=form.cleaned_data['password'])
             login(request, user)
+            merge_session_cart(request)
             return HttpResponseRedirect('/')
         data = {
             'customer': self.customer,
@@ -203,11 +294,56 @@ class RegistrationView(CustomerAndCartMixin, View):
 
 class ProfileView(CustomerAndCartMixin, View):
     def get(self, request, *args, **kwargs):
-        orders = Order.objects.filter(customer=self.customer).order_by('-created_date')
+        archive = 'archive' in request.GET
+        orders = (ArchivedOrder if archive else Order).objects.for_profile(self.customer)
+        page = Paginator(orders, getattr(settings, 'ORDER_HISTORY_PAGE_SIZE', 10)).get_page(request.GET.get('page'))
         data = {
-            'orders': (enumerate(orders, 1)),
+            'orders': enumerate(page, page.start_index()),
+            'page': page,
+            'archive': archive,
             'cart': self.cart,
             'categories': self.categories,
             'customer': self.customer,
         }
         return render(request, 'mainapp/profile.html', data)
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class InstrumentationView(View):
+    """Requests recorded by InstrumentationMiddleware, newest first; ?view= filters by view path."""
+
+    def get(self, request, *args, **kwargs):
+        entries = list(instrumentation.get_buffer())[::-1]
+        if request.GET.get('view'):
+            entries = [entry for entry in entries if entry['view'] == request.GET['view']]
+        return JsonResponse({'views': instrumentation.summary(entries), 'requests': entries})
+
+
+class AsyncBaseView(AsyncViewMixin, BaseView):
+    pass
+
+
+class AsyncProductDetailView(AsyncViewMixin, ProductDetailView):
+
+    def get_concurrent_lookups(self):
+        return dict(super().get_concurrent_lookups(), product=partial(get_product, self.kwargs['slug']))
+
+    def get_object(self, queryset=None):
+        if self.lookups['product'] is None:
+            raise Http404
+        return self.lookups['product']
+
+
+class AsyncCategoryDetailView(AsyncViewMixin, CategoryDetailView):
+
+    def get_concurrent_lookups(self):
+        return dict(super().get_concurrent_lookups(), category=partial(get_category, self.kwargs['slug']))
+
+    def get_object(self, queryset=None):
+        if self.lookups['category'] is None:
+            raise Http404
+        return self.lookups['category']
+
+
+class AsyncCartView(AsyncViewMixin, CartView):
+    pass